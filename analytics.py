@@ -0,0 +1,275 @@
+import numpy as np
+import pandas as pd
+
+from pay_schedule import income_mask, label_cycles
+
+# Starting balance the running total is built on
+OPENING_BALANCE = 3400.02
+
+# Transaction-level tables; a consolidated view concatenates them across accounts
+ROW_TABLES = ['all_transactions', 'expenses', 'defense_income', 'income']
+
+
+# Additive sums and counts per group that the pivots are derived from. Partials of several
+# accounts merge by adding them up (and min/max for the charge-day range).
+PARTIAL_KEYS = {
+    'expense_cycle_month': ['Paycheck Cycle', 'Paycheck Year Month'],
+    'income_month_cycle': ['Paycheck Year Month', 'Paycheck Cycle'],
+    'description': ['Description'],
+    'description_cycle': ['Paycheck Cycle', 'Description'],
+    'description_cycle_date': ['Paycheck Cycle', 'Description', 'Date'],
+    'description_day': ['Description', 'Day of Month', 'Month', 'Year'],
+}
+
+
+def partial_sums(expense_data, defense_income_data):
+    partials = {}
+    for name, keys in PARTIAL_KEYS.items():
+        rows = defense_income_data if name == 'income_month_cycle' else expense_data
+        partials[name] = rows.groupby(keys)['Amount'].agg(['sum', 'count'])
+    partials['description'] = partials['description'].join(
+        expense_data.groupby('Description')['Day of Month'].agg(['min', 'max']))
+    return partials
+
+
+# Add up the partials of several accounts
+def merge_partials(partials):
+    merged = {}
+    for name, keys in PARTIAL_KEYS.items():
+        frames = pd.concat([p[name] for p in partials])
+        how = {'sum': 'sum', 'count': 'sum', 'min': 'min', 'max': 'max'}
+        merged[name] = frames.groupby(level=keys).agg({col: how[col] for col in frames.columns})
+    return merged
+
+
+# Group means from a partial as a flat table with an 'Amount' column, optionally only for some descriptions
+def _partial_mean(partial, descriptions=None):
+    if descriptions is not None:
+        partial = partial.loc[partial.index.get_level_values('Description').isin(descriptions)]
+    return (partial['sum'] / partial['count']).rename('Amount').reset_index()
+
+
+# Paycheck pivots, averages and the income vs expense summaries
+def summary_tables(expense_data, defense_income_data, partials):
+    # expense pivot table by paycheck month
+    expense_pivot = partials['expense_cycle_month']['sum'].rename('Amount').reset_index()
+
+    # Q1 ANSWER: average expense for paycheck cycle in txn data
+    # (grouped rather than pivoted: an empty pivot_table loses its 'Amount' column)
+    averge_paycheck_cycle_expenses = expense_pivot.groupby('Paycheck Cycle')[['Amount']].mean()
+    averge_paycheck_cycle_expenses.reset_index(inplace=True)
+
+    # Q1 ANSWER: average expense count for paycheck cycle in txn data
+    cycle_expense_counts = partials['expense_cycle_month']['count'].rename('Amount').reset_index()
+    cycle_expense_avg_counts = cycle_expense_counts.groupby('Paycheck Cycle')[['Amount']].mean()
+    cycle_expense_avg_counts.reset_index(inplace=True)
+
+    # Q3 ANSWER: sorted by expense in descending order, and description (gives insight into the frequency and magnitude of expenses in order)
+    sorted_expense_data = expense_data.sort_values(by=['Paycheck Cycle', 'Amount', 'Description', 'Date'], ascending=[
+                                                   True, False, True, True]).reset_index(drop=True)
+
+    most_recent_income_amount = defense_income_data.loc[defense_income_data['Paycheck Year Month']
+                                                        == defense_income_data['Paycheck Year Month'].max()]
+    # accounts without paychecks (e.g. a credit card) have no recent income
+    most_recent_income = most_recent_income_amount['Amount'][:-1].values[0] \
+        if len(most_recent_income_amount) > 1 else most_recent_income_amount['Amount'].sum()
+
+    # income vs expenses overtime
+    income_sums = partials['income_month_cycle'].groupby('Paycheck Cycle')[['sum', 'count']].sum()
+    income_mean = pd.DataFrame({'Amount': income_sums['sum'] / income_sums['count']})
+    income_mean['Amount'] = round(income_mean['Amount'], 2)
+    income_mean = income_mean.rename(columns={"Amount": "Income"})
+
+    expense_mean = averge_paycheck_cycle_expenses.groupby(
+        'Paycheck Cycle').agg({'Amount': 'mean'})
+    expense_mean["Amount"] = round(expense_mean["Amount"], 2)
+    expense_mean = expense_mean.rename(columns={"Amount": "Expense"})
+
+    income_expense_mean = pd.merge(
+        income_mean, expense_mean, on=["Paycheck Cycle"])
+    income_expense_mean['Delta'] = income_expense_mean['Income'] - \
+        income_expense_mean["Expense"]
+
+    # income vs expenses for each Paycheck Year Month
+    income_data_ym = partials['income_month_cycle'][['sum']].rename(columns={'sum': 'Amount'})
+    income_data_ym['Amount'] = round(income_data_ym['Amount'], 2)
+    income_data_ym = income_data_ym.rename(columns={'Amount': 'Income'})
+
+    expense_sum_ym = partials['expense_cycle_month'][['sum']].rename(columns={'sum': 'Amount'})
+    expense_sum_ym = expense_sum_ym.reorder_levels(['Paycheck Year Month', 'Paycheck Cycle']).sort_index()
+    expense_sum_ym['Amount'] = round(expense_sum_ym['Amount'], 2)
+    expense_sum_ym = expense_sum_ym.rename(columns={'Amount': 'Expense'})
+
+    income_expense_ym = pd.merge(expense_sum_ym, income_data_ym, on=[
+                                 "Paycheck Year Month", 'Paycheck Cycle'])
+    income_expense_ym['Delta'] = income_expense_ym['Income'] - \
+        income_expense_ym['Expense']
+    income_expense_ym = income_expense_ym.sort_values(
+        ['Paycheck Year Month', 'Paycheck Cycle'], ascending=[False, True])
+
+    # without paychecks there are no cycles: the pivots stay empty and the app says why
+    income_warning = None if len(defense_income_data) else \
+        'No deposit matches the paycheck rules, so no paycheck cycles or income could be computed. ' \
+        'Check the payers and minimum amount under Paycheck Detection.'
+
+    return {
+        'most_recent_income': most_recent_income,  # most recent paycheck
+        'income_warning': income_warning,  # why the paycheck tables are empty, if they are
+        'expense_pivot': expense_pivot,  # sum of expenses for each paycheck, for each month
+        # Paycheck 1 avg, Paycheck 2 avg
+        'averge_paycheck_cycle_expenses': averge_paycheck_cycle_expenses,
+        # count of expenses for each paycheck
+        'cycle_expense_avg_counts': cycle_expense_avg_counts,
+        # check where bulk our expenses are going and their frequency
+        'sorted_expense_data': sorted_expense_data,
+        # income vs expense averages and per paycheck interval totals
+        'income_expense_mean': income_expense_mean,
+        'income_expense_ym': income_expense_ym,
+    }
+
+
+# Q2 ANSWER: recurring and common expenses
+def recurring_tables(expense_data, partials):
+    # descriptions that occur in multiple transactions (rows)
+    descriptions = partials['description']
+    recurring_expense_description = descriptions.index[descriptions['count'] >= 2]
+
+    # filter the expense data with recurring transactions
+    recurring_expenses = expense_data.loc[expense_data['Description'].isin(
+        recurring_expense_description)]
+
+    # average recurring expense for each paycheck cycle (date included)
+    recurring_expenses_date_included_pivot = _partial_mean(
+        partials['description_cycle_date'], recurring_expense_description)
+    recurring_expenses_date_included_pivot["Amount"] = round(
+        recurring_expenses_date_included_pivot["Amount"], 2)
+
+    # average recurring expense for each day
+    recurring_expenses_day_included_pivot = _partial_mean(
+        partials['description_day'], recurring_expense_description)
+    recurring_expenses_day_included_pivot["Amount"] = round(
+        recurring_expenses_day_included_pivot["Amount"], 2)
+
+    # average recurring expense for each paycheck cycle
+    recurring_expenses_pivot = _partial_mean(
+        partials['description_cycle'], recurring_expense_description)
+    recurring_expenses_pivot["Amount"] = round(
+        recurring_expenses_pivot["Amount"], 2)
+
+    # range of charge days and amount mean per description
+    recurring = descriptions.loc[recurring_expense_description]
+    recurring_expenses_charge_range = pd.DataFrame({
+        'Description': recurring.index,
+        'Min Charge Day': recurring['min'].values,
+        'Max Charge Day': recurring['max'].values,
+        'Mean Amount': (recurring['sum'] / recurring['count']).values,
+    })
+    recurring_expenses_charge_range['Mean Amount'] = round(
+        recurring_expenses_charge_range['Mean Amount'], 2)
+
+    # Display result
+    recurring_expenses_charge_range['Delta'] = recurring_expenses_charge_range['Max Charge Day'] - \
+        recurring_expenses_charge_range['Min Charge Day']
+    recurring_expenses_charge_range = recurring_expenses_charge_range.sort_values(
+        by=['Min Charge Day', 'Max Charge Day'], ascending=[True, True]).reset_index(drop=True)
+
+    return {
+        # df of transactions whose descriptions are recurring
+        'recurring_expenses': recurring_expenses,
+        # index=paycheck, description, date | amount aggfunc=mean
+        'recurring_expenses_date_included_pivot': recurring_expenses_date_included_pivot,
+        # index=paycheck, description | amount aggfunc=mean
+        'recurring_expenses_pivot': recurring_expenses_pivot,
+        # check recurring transaction descriptions and then the DAY they are made, aggregated by avergae price
+        'recurring_expense_description_day': recurring_expenses_day_included_pivot,
+        # check recurring transaction descriptions and then the range of days it has been historically charged, aggregated by avergae price
+        'recurring_expenses_charge_range': recurring_expenses_charge_range,
+    }
+
+
+# Run the full analytics pipeline over one account's statements.
+# `cycle_starts` are the paycheck cycle starts of the whole household (see pay_schedule.cycle_starts),
+# so accounts without paychecks are still labelled; `progress(step, fraction)` reports progress.
+def build_info(data_files, income_rules, opening_balance=OPENING_BALANCE, progress=None,
+               cycle_starts=None, account=None):
+    def report(step, fraction):
+        if progress is not None:
+            progress(step, fraction)
+
+    # Combine all uploaded dataframes
+    union_df = pd.concat([file_info['data'] for file_info in data_files]).sort_values(
+        by='Date', ascending=True).reset_index(drop=True)
+
+    # Transformations
+    union_df['Date'] = pd.to_datetime(union_df['Date'])
+    union_df['Day of Month'] = union_df['Date'].dt.day
+    union_df['Month'] = union_df['Date'].dt.month
+    union_df['Year'] = union_df['Date'].dt.year
+    if account is not None:
+        union_df['Account'] = account
+
+    # Label paycheck cycles from the configured income rules (single vectorized pass)
+    union_df = label_cycles(union_df, income_rules, cycle_starts)
+
+    # Q8 ANSWER: running total amount
+    # (cumulative sum seeded with the opening balance, same order of additions as a running loop)
+    union_df['Running Total'] = np.cumsum(
+        np.concatenate([[opening_balance], union_df['Amount'].values]))[1:]
+
+    # Reverse order back to descending
+    union_df = union_df.sort_values(
+        by='Date', ascending=False).reset_index(drop=True)
+
+    report('Paycheck cycles', 0.3)
+
+    # expenses
+    expense_data = union_df.loc[union_df.Amount < 0].reset_index(drop=True)
+    expense_data.Amount = expense_data.Amount * -1
+
+    # defense income (paychecks matching the income rules)
+    defense_income_data = union_df.loc[income_mask(
+        union_df, income_rules)].reset_index(drop=True)
+
+    # all income
+    income_data = union_df.loc[union_df.Amount > 0].reset_index(drop=True)
+
+    info = {
+        'all_transactions': union_df,  # all transactions
+        'expenses': expense_data,  # expenses
+        'defense_income': defense_income_data,  # AF paychecks
+        'income': income_data,  # nonnegative transactions
+        'opening_balance': opening_balance,
+        # sums and counts the pivots are built from, so accounts can be merged
+        'partials': partial_sums(expense_data, defense_income_data),
+    }
+    info.update(summary_tables(expense_data, defense_income_data, info['partials']))
+    report('Pivots', 0.6)
+    info.update(recurring_tables(expense_data, info['partials']))
+    report('Recurring expenses', 1.0)
+    return info
+
+
+# Consolidated view across accounts, merged from the per-account results: transaction tables
+# are concatenated and the pivots built from the accounts' partial sums and counts added up
+def merge_infos(infos):
+    if len(infos) == 1:
+        return next(iter(infos.values()))
+
+    merged = {}
+    for name in ROW_TABLES:
+        merged[name] = pd.concat([info[name] for info in infos.values()]).sort_values(
+            by='Date', ascending=False, kind='stable').reset_index(drop=True)
+
+    # household balance: the accounts' opening balances plus every transaction so far
+    all_transactions = merged['all_transactions'].rename(columns={'Running Total': 'Account Running Total'})
+    all_transactions = all_transactions.iloc[::-1].reset_index(drop=True)
+    opening_balance = sum(info['opening_balance'] for info in infos.values())
+    all_transactions['Running Total'] = np.cumsum(
+        np.concatenate([[opening_balance], all_transactions['Amount'].values]))[1:]
+    merged['all_transactions'] = all_transactions.iloc[::-1].reset_index(drop=True)
+    merged['opening_balance'] = opening_balance
+
+    merged['partials'] = merge_partials([info['partials'] for info in infos.values()])
+    merged.update(summary_tables(merged['expenses'], merged['defense_income'], merged['partials']))
+    merged.update(recurring_tables(merged['expenses'], merged['partials']))
+    return merged
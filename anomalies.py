@@ -0,0 +1,167 @@
+import math
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+ANOMALY_STATE = 'merchant_stats.pkl'
+# Bumped when the per-merchant stats change shape; older state is rebuilt from the statements
+STATE_VERSION = 3
+
+# Minimum history before a merchant's amount / charge day is trusted
+MIN_CHARGES = 3
+# Deviations from the merchant mean that count as a price change
+AMOUNT_Z = 3.0
+# Only merchants charged within this many days of the month have a usual window
+USUAL_WINDOW_DAYS = 7
+# The charge day is only checked for roughly monthly merchants: at most this many charges per
+# month on average (two lines billed together still count), over at least MIN_CHARGES months
+MAX_MONTHLY_CHARGES = 2
+# Extra days allowed around the usual charge-day window
+DAY_SLACK = 2
+# Share of a merchant's charges the usual window must cover, so a stray charge does not widen it
+USUAL_SHARE = 0.8
+# Charge days wrap around the month end (a charge on the 30th and one on the 1st are 2 days apart)
+MONTH_DAYS = 31
+# Same merchant and amount within this many days is a possible duplicate
+DUPLICATE_DAYS = 3
+
+
+# Empty detector state: rolling stats per merchant plus the flagged transactions
+def new_state():
+    return {'version': STATE_VERSION, 'merchants': {}, 'flagged': []}
+
+
+# Load the persisted detector state (None when missing or from an older version)
+def load_state(path=ANOMALY_STATE):
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+        if state.get('version') == STATE_VERSION:
+            return state
+    return None
+
+
+# Save the detector state
+def save_state(state, path=ANOMALY_STATE):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+# Expense rows of raw statements, oldest first, with positive amounts
+def expense_rows(df):
+    expenses = df.loc[df['Amount'] < 0, ['Date', 'Description', 'Amount', 'File']].copy()
+    expenses['Date'] = pd.to_datetime(expenses['Date'])
+    expenses['Amount'] = expenses['Amount'] * -1
+    return expenses.sort_values(by='Date', kind='stable')
+
+
+# Shortest circular run of days holding at least USUAL_SHARE of the charges, from a
+# per-day charge histogram; returns (first day index, length in days - 1)
+def usual_window(days):
+    days = np.asarray(days)
+    needed = math.ceil(USUAL_SHARE * days.sum())
+    totals = np.concatenate([[0], np.cumsum(np.concatenate([days, days]))])
+    starts = np.flatnonzero(days)
+    ends = np.searchsorted(totals, totals[starts] + needed)
+    best = np.argmin(ends - starts)
+    return int(starts[best]), int(ends[best] - starts[best] - 1)
+
+
+# Circular distance (in days) from the window [start, start + length]
+def _days_outside(day_index, start, length):
+    offset = (day_index - start) % MONTH_DAYS
+    if offset <= length:
+        return 0
+    return min(offset - length, MONTH_DAYS - offset)
+
+
+# Recurring about once a month (a bill or subscription), as opposed to an everyday merchant
+# whose charge days carry no meaning
+def _is_monthly(count, first_date, last_date):
+    months = (last_date.year - first_date.year) * 12 + last_date.month - first_date.month + 1
+    return months >= MIN_CHARGES and count <= MAX_MONTHLY_CHARGES * months
+
+
+# Score one transaction against the merchant's rolling stats (O(1), no history scan)
+def score_transaction(stats, amount, date):
+    reasons = []
+    if stats is None:
+        return reasons
+
+    count, mean, m2, days, first_date, last_date, last_amount = stats
+
+    if count >= MIN_CHARGES:
+        # floor the deviation so fixed-price subscriptions still tolerate cents of drift
+        std = (m2 / (count - 1)) ** 0.5
+        std = max(std, 0.05 * mean, 1.0)
+        if abs(amount - mean) > AMOUNT_Z * std:
+            reasons.append(f'Amount ${amount:,.2f} vs usual ${mean:,.2f}')
+
+        start, length = usual_window(days)
+        if _is_monthly(count, first_date, last_date) and length <= USUAL_WINDOW_DAYS and \
+                _days_outside(date.day - 1, start, length) > DAY_SLACK:
+            reasons.append(f'Charged on day {date.day}, usually days '
+                           f'{start + 1}-{(start + length) % MONTH_DAYS + 1}')
+
+    if abs((date - last_date).days) <= DUPLICATE_DAYS and round(amount - last_amount, 2) == 0:
+        reasons.append(f'Possible duplicate of ${last_amount:,.2f} on {last_date:%Y-%m-%d}')
+
+    return reasons
+
+
+# Fold one transaction into the merchant's rolling stats (Welford's update for the amount,
+# a per-day histogram for the charge day)
+def update_stats(stats, amount, date):
+    if stats is None:
+        days = [0] * MONTH_DAYS
+        days[date.day - 1] = 1
+        return (1, amount, 0.0, tuple(days), date, date, amount)
+
+    count, mean, m2, days, first_date, last_date, last_amount = stats
+    count += 1
+    delta = amount - mean
+    mean += delta / count
+    m2 += delta * (amount - mean)
+    days = list(days)
+    days[date.day - 1] += 1
+    return (count, mean, m2, tuple(days), first_date, date, amount)
+
+
+# Score and then absorb every expense of a newly ingested statement
+def ingest(state, df, file_name=None):
+    if file_name is not None:
+        df = df.assign(File=file_name)
+
+    merchants = state['merchants']
+    flagged = []
+
+    for date, description, amount, file_name in expense_rows(df).itertuples(index=False):
+        stats = merchants.get(description)
+        reasons = score_transaction(stats, amount, date)
+        if reasons:
+            flagged.append({'Date': date, 'Description': description, 'Amount': amount,
+                            'Reason': '; '.join(reasons), 'File': file_name})
+        merchants[description] = update_stats(stats, amount, date)
+
+    state['flagged'].extend(flagged)
+    return flagged
+
+
+# Build the state from already uploaded statements (oldest transactions first)
+def bootstrap(data_files):
+    state = new_state()
+    if data_files:
+        history = pd.concat([file_info['data'].assign(File=file_info['file_name'])
+                             for file_info in data_files])
+        ingest(state, history)
+    return state
+
+
+# Flagged transactions, most recent first
+def flagged_table(state):
+    flagged = pd.DataFrame(state['flagged'], columns=['Date', 'Description', 'Amount', 'Reason', 'File'])
+    return flagged.sort_values(by='Date', ascending=False).reset_index(drop=True)
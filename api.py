@@ -0,0 +1,270 @@
+import argparse
+import collections
+import hashlib
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+
+from ledger_store import (GROCERY_BUDGET, GROCERY_BUDGETS, GROCERY_EXPENSES, PAYCHECK1_EXPENSES, PAYCHECK1_INCOME,
+                          PAYCHECK2_EXPENSES, PAYCHECK2_INCOME, current_period, ledger_total, load_settings,
+                          period_budget)
+from worker import RESULTS_PATH, load_results
+
+HOST = '127.0.0.1'
+PORT = 8502
+
+# Files the served numbers are computed from; any change to them is a new data version
+SOURCE_FILES = [RESULTS_PATH, PAYCHECK1_EXPENSES, PAYCHECK2_EXPENSES, GROCERY_EXPENSES,
+                PAYCHECK1_INCOME, PAYCHECK2_INCOME, GROCERY_BUDGET, GROCERY_BUDGETS]
+
+# Responses kept per (data version, request); older versions age out
+MAX_CACHED_RESPONSES = 256
+
+# Query parameter -> column it filters on (merchant also matches the cadence table's 'Merchant')
+FILTER_COLUMNS = {'start': 'Date', 'end': 'Date', 'cycle': 'Paycheck Cycle', 'merchant': 'Description'}
+
+
+class QueryError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# Version of the served data: the source files' mtime/size (plus the month, for budget defaults).
+# Cheap enough to check on every request, so an unchanged version never recomputes anything.
+def data_version():
+    parts = [current_period()]
+    for path in SOURCE_FILES:
+        try:
+            stat = os.stat(path)
+            parts.append(f'{path}:{stat.st_mtime_ns}:{stat.st_size}')
+        except FileNotFoundError:
+            parts.append(f'{path}:-')
+    return hashlib.sha256('|'.join(parts).encode()).hexdigest()
+
+
+# Analytics results shared by every request thread, re-read only when the results file changes
+class ResultsCache:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stamp = None
+        self.results = None
+
+    def get(self):
+        try:
+            stat = os.stat(RESULTS_PATH)
+            stamp = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            stamp = None
+        with self.lock:
+            if stamp != self.stamp:
+                self.results = load_results() if stamp is not None else None
+                self.stamp = stamp
+            return self.results
+
+
+# Rendered responses keyed by (data version, path, query), least recently used evicted first
+class ResponseCache:
+    def __init__(self, max_entries=MAX_CACHED_RESPONSES):
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()
+        self.max_entries = max_entries
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+_results = ResultsCache()
+_responses = ResponseCache()
+
+
+def _info(results, account):
+    if results is None:
+        raise QueryError(503, 'no analytics results yet; open the app or ingest statements first')
+    if account is None:
+        return results['info']
+    if account not in results['accounts']:
+        raise QueryError(404, f'unknown account {account!r}')
+    return results['accounts'][account]
+
+
+# Filter a table by date range, paycheck cycle and merchant (substring, case-insensitive)
+def filter_table(df, query):
+    if any(df.index.names):
+        df = df.reset_index()
+    for param, column in FILTER_COLUMNS.items():
+        value = query.get(param)
+        if value is None:
+            continue
+        if param == 'merchant' and column not in df.columns and 'Merchant' in df.columns:
+            column = 'Merchant'
+        if column not in df.columns:
+            raise QueryError(400, f'this table has no {column!r} column to filter by {param}')
+
+        if param in ('start', 'end'):
+            try:
+                bound = pd.Timestamp(value)
+            except ValueError:
+                raise QueryError(400, f'{param} is not a date: {value!r}')
+            dates = pd.to_datetime(df[column])
+            df = df.loc[dates >= bound] if param == 'start' else df.loc[dates < bound + pd.Timedelta(days=1)]
+        elif param == 'merchant':
+            df = df.loc[df[column].astype(str).str.contains(value, case=False, regex=False)]
+        else:
+            df = df.loc[df[column] == value]
+
+    if 'limit' in query:
+        if not query['limit'].isdigit():
+            raise QueryError(400, f"limit is not a number: {query['limit']!r}")
+        df = df.head(int(query['limit']))
+    return df
+
+
+def _records(df):
+    return json.loads(df.to_json(orient='records', date_format='iso'))
+
+
+def list_tables(query):
+    info = _info(_results.get(), query.get('account'))
+    return {'tables': {name: len(value) for name, value in info.items() if isinstance(value, pd.DataFrame)}}
+
+
+def get_table(name, query):
+    results = _results.get()
+    info = _info(results, query.get('account'))
+    if name == 'merchant_cadence':
+        # cadences are inferred household-wide
+        table = results['info'].get(name)
+    else:
+        table = info.get(name)
+    if not isinstance(table, pd.DataFrame):
+        raise QueryError(404, f'unknown table {name!r}')
+    table = filter_table(table, query)
+    return {'table': name, 'rows': len(table), 'data': _records(table)}
+
+
+# Remaining paycheck balances and the grocery budget of a month, as shown in the app
+# (read-only: stale ledger totals are rescanned but never written back from here)
+def get_balances(query):
+    month = query.get('month', current_period())
+    paychecks = {}
+    for name, income_path, income_key, ledger_path in [
+            ('paycheck_1', PAYCHECK1_INCOME, 'paycheck1_key', PAYCHECK1_EXPENSES),
+            ('paycheck_2', PAYCHECK2_INCOME, 'paycheck2_key', PAYCHECK2_EXPENSES)]:
+        income = load_settings(income_path).get(income_key, 0.0)
+        expenses, count = ledger_total(ledger_path, persist=False)
+        paychecks[name] = {'income': income, 'expenses': expenses, 'entries': count,
+                           'remaining': round(income - expenses, 2)}
+
+    budget = period_budget(month)
+    spent, count = ledger_total(GROCERY_EXPENSES, month, persist=False)
+    paychecks['grocery'] = {'month': month, 'budget': budget, 'spent': spent, 'entries': count,
+                            'remaining': round(budget - spent, 2)}
+    return paychecks
+
+
+def get_version(query):
+    results = _results.get()
+    return {'version': data_version(),
+            'completed_at': results['completed_at'] if results is not None else None,
+            'accounts': list(results['accounts']) if results is not None else []}
+
+
+# Path -> handler(query); /tables/<name> is matched separately
+ROUTES = {
+    '/version': get_version,
+    '/balances': get_balances,
+    '/tables': list_tables,
+}
+
+
+def route(path, query):
+    if path in ROUTES:
+        return ROUTES[path](query)
+    if path.startswith('/tables/'):
+        return get_table(path[len('/tables/'):], query)
+    raise QueryError(404, f'unknown endpoint {path!r}')
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    server_version = 'FinanceQuery/1.0'
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        path = url.path.rstrip('/') or '/'
+
+        # the ETag only depends on the data version and the request, so a client holding
+        # the current one gets a 304 without any table being touched
+        version = data_version()
+        request_key = json.dumps([path, sorted(query.items())])
+        etag = '"{}"'.format(hashlib.sha256(f'{version}|{request_key}'.encode()).hexdigest()[:32])
+        if etag in (tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')):
+            self._send(304, None, etag)
+            return
+
+        cached = _responses.get((version, request_key))
+        if cached is None:
+            try:
+                body = json.dumps(route(path, query), default=str).encode()
+            except QueryError as e:
+                self._send(e.status, json.dumps({'error': str(e)}).encode())
+                return
+            except Exception as e:
+                # e.g. a store file caught mid-write; the client gets JSON rather than a dropped connection
+                self._send(500, json.dumps({'error': f'{type(e).__name__}: {e}'}).encode())
+                return
+            cached = body
+            _responses.put((version, request_key), body)
+        self._send(200, cached, etag)
+
+    def _send(self, status, body, etag=None):
+        self.send_response(status)
+        if etag is not None:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+        if body is not None:
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body is not None:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Serve until interrupted; one thread per connection, all sharing the caches above
+def serve(host=HOST, port=PORT):
+    server = ThreadingHTTPServer((host, port), QueryHandler)
+    server.daemon_threads = True
+    print(f'Serving finance tables on http://{host}:{port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Read-only JSON API over the computed finance tables.')
+    parser.add_argument('--host', default=HOST, help='interface to listen on (local only by default)')
+    parser.add_argument('--port', type=int, default=PORT)
+    args = parser.parse_args()
+    serve(args.host, args.port)
@@ -0,0 +1,89 @@
+import numpy as np
+
+# Chart resolutions offered in the app, mapped to pandas resample rules
+# (paycheck cycles are not calendar based, so they are grouped separately)
+RESOLUTIONS = {
+    'Day': 'D',
+    'Week': 'W',
+    'Paycheck Cycle': None,
+    'Month': 'MS',
+}
+
+# Upper bound on points sent to the browser for a single series
+MAX_CHART_POINTS = 250
+
+
+# Bucket a dated series into the selected resolution
+def _bucket(df, value_col, resolution, how):
+    df = df.sort_values(by='Date', kind='stable')
+    rule = RESOLUTIONS[resolution]
+
+    if rule is None:
+        # one bucket per paycheck interval, plotted at the interval's first transaction
+        grouped = df.dropna(subset=['Paycheck Cycle']).groupby(
+            ['Paycheck Year Month', 'Paycheck Cycle'], sort=False)
+        bucketed = grouped.agg(Date=('Date', 'min'), Value=(value_col, how))
+        bucketed = bucketed.sort_values(by='Date').reset_index(drop=True)
+    else:
+        bucketed = df.set_index('Date')[value_col].resample(rule).agg(how)
+        if how == 'last':
+            # carry the balance through buckets without transactions
+            bucketed = bucketed.ffill()
+        bucketed = bucketed.rename('Value').reset_index()
+
+    return bucketed.rename(columns={'Value': value_col})
+
+
+# Largest-Triangle-Three-Buckets: keep the points that preserve the visual shape
+def downsample_lttb(x, y, max_points=MAX_CHART_POINTS):
+    n = len(x)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+
+    # first and last points are always kept, the rest is split into equal buckets
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    keep = np.empty(max_points, dtype=np.int64)
+    keep[0] = 0
+    keep[-1] = n - 1
+
+    prev = 0
+    for b in range(max_points - 2):
+        start, stop = edges[b], edges[b + 1]
+        # average of the next bucket is the third vertex of the triangle
+        next_stop = edges[b + 2] if b + 2 < len(edges) else n
+        avg_x = x[stop:next_stop].mean()
+        avg_y = y[stop:next_stop].mean()
+
+        area = np.abs((x[prev] - avg_x) * (y[start:stop] - y[prev])
+                      - (x[prev] - x[start:stop]) * (avg_y - y[prev]))
+        prev = start + int(np.argmax(area))
+        keep[b + 1] = prev
+
+    return keep
+
+
+# Reduce a bucketed series to at most `max_points` rows
+def _bounded(df, value_col, max_points):
+    df = df.dropna(subset=[value_col]).reset_index(drop=True)
+    keep = downsample_lttb(df['Date'].values.astype('int64'),
+                           df[value_col].values, max_points)
+    df = df.iloc[keep].reset_index(drop=True)
+    df[value_col] = df[value_col].round(2)
+    return df[['Date', value_col]]
+
+
+# Running balance at the end of each bucket
+def balance_chart_data(union_df, resolution, max_points=MAX_CHART_POINTS):
+    bucketed = _bucket(union_df[['Date', 'Paycheck Year Month', 'Paycheck Cycle', 'Running Total']],
+                       'Running Total', resolution, 'last')
+    return _bounded(bucketed, 'Running Total', max_points)
+
+
+# Total spend in each bucket
+def spend_chart_data(expense_data, resolution, max_points=MAX_CHART_POINTS):
+    bucketed = _bucket(expense_data[['Date', 'Paycheck Year Month', 'Paycheck Cycle', 'Amount']],
+                       'Amount', resolution, 'sum')
+    return _bounded(bucketed, 'Amount', max_points)
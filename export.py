@@ -0,0 +1,116 @@
+import datetime
+import hashlib
+import json
+import os
+import tempfile
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+EXPORT_DIR = 'exports'
+MANIFEST = 'manifest.json'
+
+
+# Content hash of the transactions every exported table is derived from
+def data_hash(df):
+    hashed = pd.util.hash_pandas_object(df, index=False).values
+    columns = ','.join(map(str, df.columns)).encode()
+    return hashlib.sha256(columns + hashed.tobytes()).hexdigest()
+
+
+# Read the manifest of the last export, if any
+def load_manifest(out_dir=EXPORT_DIR):
+    path = os.path.join(out_dir, MANIFEST)
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            try:
+                return json.load(f)
+            except json.JSONDecodeError:
+                return None
+    return None
+
+
+# Write to a temp file and swap it in, so readers holding a memory map keep the old file
+# (a unique temp name, as the app and the inbox process may export at the same time)
+def _replace(path, write):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def _write_json(data, path):
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+
+
+def _write_arrow(table, path):
+    with pa.OSFile(path, 'wb') as sink:
+        # uncompressed IPC file so consumers can memory-map it without copying
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+# Export every table in `info` as Arrow IPC + Parquet with a schema manifest.
+# Tables whose content hash is unchanged since the last export are not rewritten, so new or
+# reshaped tables are exported even when the transactions have not changed.
+def export_info(info, out_dir=EXPORT_DIR):
+    manifest = load_manifest(out_dir) or {}
+    previous = manifest.get('tables', {})
+
+    os.makedirs(out_dir, exist_ok=True)
+    tables = {}
+    values = {}
+    for name, value in info.items():
+        # the partial sums are merge inputs, not tables of their own
+        if name == 'partials':
+            continue
+        if not isinstance(value, pd.DataFrame):
+            values[name] = value.item() if hasattr(value, 'item') else value
+            continue
+
+        # grouped tables keep their keys as ordinary columns
+        if any(value.index.names):
+            value = value.reset_index()
+        table_hash = data_hash(value)
+        if previous.get(name, {}).get('hash') == table_hash and \
+                os.path.exists(os.path.join(out_dir, previous[name]['arrow'])):
+            tables[name] = previous[name]
+            continue
+
+        table = pa.Table.from_pandas(value, preserve_index=False)
+        arrow_file = f'{name}.arrow'
+        parquet_file = f'{name}.parquet'
+        _replace(os.path.join(out_dir, arrow_file), lambda path: _write_arrow(table, path))
+        _replace(os.path.join(out_dir, parquet_file), lambda path: pq.write_table(table, path))
+        tables[name] = {
+            'arrow': arrow_file,
+            'parquet': parquet_file,
+            'rows': table.num_rows,
+            'hash': table_hash,
+            'schema': [{'name': field.name, 'type': str(field.type)} for field in table.schema],
+        }
+
+    if tables == previous and values == manifest.get('values'):
+        return manifest
+
+    # the manifest goes last, so it only ever describes a complete export
+    manifest = {
+        'source_hash': data_hash(info['all_transactions']),
+        'exported_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'tables': tables,
+        'values': values,
+    }
+    _replace(os.path.join(out_dir, MANIFEST), lambda path: _write_json(manifest, path))
+    return manifest
+
+
+# Zero-copy read of an exported table for notebooks and other local tools
+def open_table(name, out_dir=EXPORT_DIR):
+    source = pa.memory_map(os.path.join(out_dir, f'{name}.arrow'), 'r')
+    return pa.ipc.open_file(source).read_all()
@@ -1,47 +1,28 @@
-import json
 import streamlit as st
-import pandas as pd
-import os
-
-GROCERY_BUDGET = 'grocery_budget.csv'
-GROCERY_EXPENSES = 'grocery_expenses.csv'
-
-# Load grocery data
-def load_grocery_expense_data():
-    return pd.read_csv(GROCERY_EXPENSES) if os.path.exists(GROCERY_EXPENSES) else pd.DataFrame(columns=['date', 'store', 'amount'])
-
-# Save grocery data
-def save_grocery_expense_data():
-    st.session_state.grocery_expense_data.to_csv(GROCERY_EXPENSES, index=False)
-
-# Initialize
-if 'grocery_expense_data' not in st.session_state:
-    st.session_state.grocery_expense_data = load_grocery_expense_data()
-
-# LOAD Grocery Budget
-def load_groc_budget():
-    if os.path.exists(GROCERY_BUDGET):
-        with open(GROCERY_BUDGET, 'r') as f:
-            try:
-                return json.load(f)
-            except json.JSONDecodeError:
-                return {}
-    return {}
-
-# SAVE Grocery Budget
+from ledger_store import (GROCERY_EXPENSES, add_entry, budget_periods, changed_rows, clear_ledger,
+                          current_period, delete_entry, ledger_total, load_ledger, reset_row_state, save_budget,
+                          sync_budget, update_entry)
+
+# SAVE Grocery Budget (for the selected month)
 def save_groc_budget():
-    with open(GROCERY_BUDGET, 'w') as f:
-        json.dump({'grocery_budget_key': st.session_state.grocery_budget_key}, f)
+    save_budget(st.session_state.get('grocery_period', current_period()), st.session_state.grocery_budget_key)
+
+# Initialize from the shared store (also picks up changes saved by the finance app)
+grocery_period = st.session_state.get('grocery_period', current_period())
+st.session_state.grocery_expense_data = load_ledger(GROCERY_EXPENSES)
+reset_row_state(st.session_state, GROCERY_EXPENSES, ('txn3', 'cost3', 'date3'))
+sync_budget(st.session_state, grocery_period)
 
-# Calculate total cost of groceries so far
-grocery_total_expenses = st.session_state.grocery_expense_data['amount'].sum(
-) if not st.session_state.grocery_expense_data.empty else 0
+# Total cost of groceries in the selected month (a lookup of the running totals)
+grocery_total_expenses, _ = ledger_total(GROCERY_EXPENSES, grocery_period)
 
-# Remaining balance for grocery budget
+# Remaining balance for the month's grocery budget
 remaining_grocery_budget = st.session_state.grocery_budget_key - grocery_total_expenses
 
 # Grocery
 st.write('### Grocery Budget')
+grocery_periods = budget_periods(grocery_period)
+st.selectbox('Budget month', grocery_periods, index=grocery_periods.index(grocery_period), key='grocery_period')
 # Budget decision input
 st.number_input(
     'Decision',
@@ -69,13 +50,7 @@ with st.form('New Grocery Expense'):
     submit = st.form_submit_button('Submit Expense')
 
 if submit and store:
-    nw_entry = pd.DataFrame(
-        [[dt, store, costt]], columns=['date', 'store', 'amount']
-    )
-    st.session_state.grocery_expense_data = pd.concat(
-        [st.session_state.grocery_expense_data, nw_entry], ignore_index=True
-    )
-    save_grocery_expense_data()
+    add_entry(GROCERY_EXPENSES, {'date': dt, 'store': store, 'amount': costt})
     st.rerun()
 
 import datetime
@@ -116,20 +91,15 @@ for index, row in st.session_state.grocery_expense_data.iterrows():
 
     # Delete button
     if col4.button("❌", key=f"del3_{index}"):
-        updated_expenses.drop(index, inplace=True)
-        updated_expenses.reset_index(drop=True, inplace=True)
-        st.session_state.grocery_expense_data = updated_expenses
-        save_grocery_expense_data()
+        delete_entry(GROCERY_EXPENSES, index)
         st.rerun()
 
-# Save updates back to session state if there are changes
-if not updated_expenses.equals(st.session_state.grocery_expense_data):
-    st.session_state.grocery_expense_data = updated_expenses
-    save_grocery_expense_data()
+# Save edited rows (the running totals are adjusted by each row's change)
+for index in changed_rows(GROCERY_EXPENSES, st.session_state.grocery_expense_data, updated_expenses):
+    update_entry(GROCERY_EXPENSES, index, updated_expenses.loc[index])
+st.session_state.grocery_expense_data = updated_expenses
 
 # Button to clear all second paycheck expenses
 if st.button("Clear All Grocery Expenses"):
-    st.session_state.grocery_expense_data = pd.DataFrame(
-        columns=['date', 'store', 'amount'])
-    save_grocery_expense_data()
+    clear_ledger(GROCERY_EXPENSES)
     st.rerun()
\ No newline at end of file
@@ -0,0 +1,100 @@
+import argparse
+import datetime
+import os
+import shutil
+import time
+
+from ingest import DEFAULT_ACCOUNT
+from worker import JOBS_DIR, Worker
+
+INBOX_DIR = 'inbox'
+ARCHIVE_DIR = 'archive'
+
+# Seconds between directory scans
+POLL_SECONDS = 5
+# A file must keep the same mtime/size this long before it is ingested (still being written otherwise)
+SETTLE_SECONDS = 10
+
+
+# (mtime, size) of every CSV currently in the inbox
+def scan(inbox_dir):
+    stamps = {}
+    for entry in os.scandir(inbox_dir):
+        if entry.is_file() and entry.name.lower().endswith('.csv'):
+            stat = entry.stat()
+            stamps[entry.path] = (stat.st_mtime_ns, stat.st_size)
+    return stamps
+
+
+# Move an ingested (or rejected) file out of the inbox
+def archive(path, archive_dir):
+    os.makedirs(archive_dir, exist_ok=True)
+    stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+    shutil.move(path, os.path.join(archive_dir, f'{stamp}-{os.path.basename(path)}'))
+
+
+# Watch the inbox and batch-ingest settled CSVs into `account` through the background worker
+def watch(inbox_dir=INBOX_DIR, archive_dir=ARCHIVE_DIR, poll_seconds=POLL_SECONDS,
+          settle_seconds=SETTLE_SECONDS, once=False, account=DEFAULT_ACCOUNT):
+    os.makedirs(inbox_dir, exist_ok=True)
+    # separate job directory so the app's worker does not resume this process's jobs
+    worker = Worker(jobs_dir=os.path.join(JOBS_DIR, 'inbox'))
+
+    # path -> (stamp, time the stamp was first seen)
+    pending = {}
+    # path -> stamp of a batch that failed; retried only once the file changes
+    failed = {}
+
+    while True:
+        now = time.monotonic()
+        stamps = scan(inbox_dir)
+        for path, stamp in stamps.items():
+            if path not in pending or pending[path][0] != stamp:
+                pending[path] = (stamp, now)
+        for path in set(pending) - set(stamps):
+            del pending[path]
+
+        ready = sorted(path for path, (stamp, since) in pending.items()
+                       if (once or now - since >= settle_seconds) and failed.get(path) != stamp)
+
+        if ready:
+            uploads = []
+            for path in ready:
+                with open(path, 'rb') as f:
+                    content = f.read()
+                uploads.append((os.path.basename(path), content))
+
+            job = worker.wait(worker.submit_ingest(uploads, account)['id'])
+            if job['status'] == 'done':
+                rejected = {reason.split(':', 1)[0] for reason in job['rejected']}
+                for path, (file_name, _) in zip(ready, uploads):
+                    archive(path, os.path.join(archive_dir, 'rejected') if file_name in rejected else archive_dir)
+                    del pending[path]
+                print(f"{_now()} ingested {', '.join(job['added']) or 'no new statements'}")
+                for reason in job['rejected']:
+                    print(f'{_now()} rejected {reason}')
+            else:
+                for path in ready:
+                    failed[path] = pending[path][0]
+                print(f"{_now()} batch failed: {job['error']}")
+
+        if once:
+            return
+        time.sleep(poll_seconds)
+
+
+def _now():
+    return datetime.datetime.now().isoformat(timespec='seconds')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Ingest bank statement CSVs dropped into an inbox folder.')
+    parser.add_argument('--inbox', default=INBOX_DIR)
+    parser.add_argument('--archive', default=ARCHIVE_DIR)
+    parser.add_argument('--poll', type=float, default=POLL_SECONDS, help='seconds between scans')
+    parser.add_argument('--settle', type=float, default=SETTLE_SECONDS,
+                        help='seconds a file must stay unchanged before it is ingested')
+    parser.add_argument('--once', action='store_true', help='ingest what is there now and exit')
+    parser.add_argument('--account', default=DEFAULT_ACCOUNT, help='account the statements belong to')
+    args = parser.parse_args()
+    watch(args.inbox, args.archive, args.poll, args.settle, args.once, args.account)
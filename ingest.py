@@ -0,0 +1,231 @@
+import contextlib
+import fcntl
+import hashlib
+import io
+import json
+import os
+import pickle
+import re
+import threading
+
+import pandas as pd
+
+import anomalies
+from analytics import OPENING_BALANCE
+
+DATA_FILE_PATH = 'uploaded_files.pkl'
+ACCOUNTS_FILE = 'accounts.json'
+ACCOUNTS_DIR = 'accounts'
+DEFAULT_ACCOUNT = 'Checking'
+# Held while the statement, account and anomaly stores are read, changed and written back;
+# the app, its worker and the inbox watcher run in different processes
+STORE_LOCK = 'statement_store.lock'
+
+# Columns every bank statement export must provide
+REQUIRED_COLUMNS = ['Date', 'Description', 'Amount']
+
+
+_lock_depth = threading.local()
+
+
+# Exclusive inter-process lock on the stores (re-entrant within a thread)
+@contextlib.contextmanager
+def store_lock(path=STORE_LOCK):
+    if getattr(_lock_depth, 'value', 0):
+        _lock_depth.value += 1
+        try:
+            yield
+        finally:
+            _lock_depth.value -= 1
+        return
+
+    with open(path, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        _lock_depth.value = 1
+        try:
+            yield
+        finally:
+            _lock_depth.value = 0
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+# LOAD the account registry: name -> {'opening_balance': ...}
+def load_accounts():
+    accounts = {DEFAULT_ACCOUNT: {'opening_balance': OPENING_BALANCE}}
+    if os.path.exists(ACCOUNTS_FILE):
+        with open(ACCOUNTS_FILE, 'r') as f:
+            try:
+                accounts.update(json.load(f))
+            except json.JSONDecodeError:
+                pass
+    return accounts
+
+
+# SAVE the account registry
+def save_accounts(accounts):
+    with open(ACCOUNTS_FILE, 'w') as f:
+        json.dump(accounts, f, indent=2)
+
+
+# Add an account to the registry (existing accounts keep their settings). A name whose
+# statement file would be another account's (e.g. "My Card" and "My_Card") is rejected.
+def register_account(name, opening_balance=0.0):
+    with store_lock():
+        accounts = load_accounts()
+        if name not in accounts:
+            # compared case-insensitively, as the file system may be
+            path = partition_path(name).lower()
+            for existing in accounts:
+                if partition_path(existing).lower() == path:
+                    raise ValueError(f'account name {name!r} is too similar to existing account {existing!r}')
+            accounts[name] = {'opening_balance': opening_balance}
+            save_accounts(accounts)
+    return accounts
+
+
+# Each account's statements are stored in their own file; the default account keeps
+# the original file so existing data needs no migration
+def partition_path(account):
+    if account == DEFAULT_ACCOUNT:
+        return DATA_FILE_PATH
+    return os.path.join(ACCOUNTS_DIR, re.sub(r'[^A-Za-z0-9_-]+', '_', account) + '.pkl')
+
+
+# Load the uploaded statements of one account, or of every account, tagged with their account
+def load_data_files(account=None):
+    if account is None:
+        return [file_info for name in load_accounts() for file_info in load_data_files(name)]
+
+    path = partition_path(account)
+    data_files = []
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            data_files = pickle.load(f)
+    for file_info in data_files:
+        file_info['account'] = account
+    return data_files
+
+
+# Save the uploaded statements (temp file + rename, so readers never see a partial pickle).
+# Without `account`, `data_files` is the full list and every account's file is rewritten.
+def save_data_files(data_files, account=None):
+    if account is None:
+        for name in load_accounts():
+            save_data_files([f for f in data_files if f.get('account', DEFAULT_ACCOUNT) == name], name)
+        return
+
+    path = partition_path(account)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(data_files, f)
+    os.replace(tmp_path, path)
+
+
+# Parse and validate one statement CSV; returns (DataFrame, None) or (None, reason)
+def parse_statement(file_name, content):
+    try:
+        df = pd.read_csv(io.BytesIO(content))
+    except (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError) as e:
+        return None, f'{file_name}: could not be read ({e})'
+
+    missing = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+    if missing:
+        return None, f"{file_name}: missing column(s) {', '.join(missing)}"
+    if pd.to_datetime(df['Date'], errors='coerce').isna().any():
+        return None, f'{file_name}: unreadable dates in the Date column'
+    if pd.to_numeric(df['Amount'], errors='coerce').isna().any():
+        return None, f'{file_name}: non-numeric values in the Amount column'
+    return df, None
+
+
+# Content hash of a parsed statement (independent of its file name)
+def statement_hash(df):
+    hashed = pd.util.hash_pandas_object(df, index=False).values
+    return hashlib.sha256(','.join(map(str, df.columns)).encode() + hashed.tobytes()).hexdigest()
+
+
+# Transaction identity: date, description, amount in cents
+def _row_keys(df):
+    return pd.DataFrame({
+        'Date': pd.to_datetime(df['Date']).dt.normalize(),
+        'Description': df['Description'].astype(str),
+        'Cents': (pd.to_numeric(df['Amount']) * 100).round().astype('int64'),
+    })
+
+
+# Rows of `df` not already stored. Identical transactions are told apart by their occurrence
+# number, so a statement with two $5 charges on a day adds the second one only if just one is stored.
+def new_rows(data_files, df):
+    keys = _row_keys(df)
+    if not data_files:
+        return pd.Series(True, index=df.index)
+    stored = pd.concat([_row_keys(f['data']) for f in data_files]).value_counts()
+    seen = stored.reindex(pd.MultiIndex.from_frame(keys)).fillna(0).values
+    occurrence = keys.groupby(list(keys.columns)).cumcount().values
+    return pd.Series(occurrence >= seen, index=df.index)
+
+
+# Keep stored file names unique: a different statement reusing a name gets a content suffix
+def _unique_name(file_name, content_hash, data_files):
+    if all(f['file_name'] != file_name for f in data_files):
+        return file_name
+    stem, ext = os.path.splitext(file_name)
+    return f'{stem}-{content_hash[:8]}{ext}'
+
+
+# Append parsed statements to an account and score their transactions for anomalies.
+# Deduplicated on content, whatever the file is called (UI upload or inbox): a statement
+# already stored is skipped, and of an overlapping export only the new transactions are kept.
+# Returns the names that were added.
+def add_statements(parsed, account=DEFAULT_ACCOUNT):
+    with store_lock():
+        register_account(account)
+        data_files = load_data_files(account)
+        anomaly_state = load_anomaly_state()
+
+        added = []
+        for file_info in parsed:
+            content_hash = statement_hash(file_info['data'])
+            if any(f.get('content_hash') == content_hash for f in data_files):
+                continue
+            keep = new_rows(data_files, file_info['data'])
+            if not keep.any():
+                continue
+
+            file_name = _unique_name(file_info['file_name'], content_hash, data_files)
+            data = file_info['data'].loc[keep].reset_index(drop=True)
+            data_files.append(dict(file_info, file_name=file_name, data=data,
+                                   content_hash=content_hash, account=account))
+            anomalies.ingest(anomaly_state, data, file_name)
+            added.append(file_name)
+
+        if added:
+            save_data_files(data_files, account)
+            anomalies.save_state(anomaly_state)
+    return added
+
+
+# Per-merchant anomaly state, seeded from the stored statements the first time
+def load_anomaly_state():
+    with store_lock():
+        anomaly_state = anomalies.load_state()
+        if anomaly_state is None:
+            anomaly_state = anomalies.bootstrap(load_data_files())
+            anomalies.save_state(anomaly_state)
+    return anomaly_state
+
+
+# Remove one stored statement and rebuild the merchant stats without it
+def delete_statement(account, file_name):
+    with store_lock():
+        data_files = [f for f in load_data_files(account) if f['file_name'] != file_name]
+        save_data_files(data_files, account)
+        anomalies.save_state(anomalies.bootstrap(load_data_files()))
+
+
+# Remove every stored statement of every account
+def clear_statements():
+    with store_lock():
+        save_data_files([])
+        anomalies.save_state(anomalies.new_state())
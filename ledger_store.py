@@ -0,0 +1,285 @@
+import copy
+import json
+import os
+import threading
+
+import pandas as pd
+
+PAYCHECK1_EXPENSES = "paycheck1_expenses.csv"
+PAYCHECK2_EXPENSES = "second_paycheck_expenses.csv"
+PAYCHECK1_INCOME = 'paycheck1_income.json'
+PAYCHECK2_INCOME = 'paycheck2_income.json'
+GROCERY_BUDGET = 'grocery_budget.csv'
+GROCERY_EXPENSES = 'grocery_expenses.csv'
+# Grocery budget per month, e.g. {'2025-03': 400.0}
+GROCERY_BUDGETS = 'grocery_budgets.json'
+# Running sums and counts of every ledger, overall and per month
+LEDGER_TOTALS = 'ledger_totals.json'
+
+# Columns of an empty ledger
+LEDGER_COLUMNS = {
+    PAYCHECK1_EXPENSES: ['txn', 'cost', 'd'],
+    PAYCHECK2_EXPENSES: ['txn', 'cost', 'd'],
+    GROCERY_EXPENSES: ['date', 'store', 'amount'],
+}
+
+# Date and amount columns of each ledger
+LEDGER_FIELDS = {
+    PAYCHECK1_EXPENSES: ('d', 'cost'),
+    PAYCHECK2_EXPENSES: ('d', 'cost'),
+    GROCERY_EXPENSES: ('date', 'amount'),
+}
+
+# path -> ((mtime, size), parsed value); shared by every session in the process
+_cache = {}
+_lock = threading.Lock()
+
+
+# File identity used to revalidate the cache (None when the file does not exist)
+def _stamp(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+# Parsed contents of `path`, re-read only when the file changed on disk
+def _cached(path, parse):
+    stamp = _stamp(path)
+    with _lock:
+        hit = _cache.get(path)
+        if hit is not None and hit[0] == stamp:
+            return hit[1]
+
+    value = parse(path) if stamp is not None else None
+    with _lock:
+        _cache[path] = (stamp, value)
+    return value
+
+
+# Remember what was just written, so the next load does not re-read our own write
+def _store(path, value):
+    with _lock:
+        _cache[path] = (_stamp(path), value)
+
+
+def _read_settings(path):
+    with open(path, 'r') as f:
+        try:
+            return json.load(f)
+        except json.JSONDecodeError:
+            return {}
+
+
+# Load a ledger (a copy, so callers can edit it freely)
+def load_ledger(path):
+    df = _cached(path, pd.read_csv)
+    return df.copy() if df is not None else pd.DataFrame(columns=LEDGER_COLUMNS[path])
+
+
+# Save a ledger
+def save_ledger(path, df):
+    df.to_csv(path, index=False)
+    _store(path, df.copy())
+
+
+# Forget a ledger's per-row widget values (keys like 'txn_3') when the ledger file changed since
+# this session last saw it, so the session never writes stale rows back over edits or deletes
+# saved by the other app (or by its own previous run)
+def reset_row_state(state, path, prefixes):
+    stamp_key = f'_{path}_stamp'
+    stamp = _stamp(path)
+    if state.get(stamp_key) != stamp:
+        for key in list(state.keys()):
+            prefix, _, index = str(key).rpartition('_')
+            if prefix in prefixes and index.isdigit():
+                del state[key]
+        state[stamp_key] = stamp
+
+
+# Load a settings file
+def load_settings(path):
+    settings = _cached(path, _read_settings)
+    return dict(settings) if settings is not None else {}
+
+
+# Save a single-value settings file
+def save_setting(path, key, value):
+    _write_json(path, {key: value})
+
+
+def _write_json(path, value):
+    with open(path, 'w') as f:
+        json.dump(value, f)
+    _store(path, value)
+
+
+# Copy a stored setting into session state when the file holds a value this session
+# has not seen yet (first run, or a change saved by the other app)
+def sync_setting(state, path, key, default=0.0):
+    _sync(state, key, load_settings(path).get(key, default))
+
+
+def _sync(state, key, value):
+    stored_key = f'_{key}_stored'
+    if key not in state or state.get(stored_key) != value:
+        state[key] = value
+        state[stored_key] = value
+
+
+# Budget period of a ledger entry ('YYYY-MM'), None for a missing date
+def period_of(date):
+    date = pd.to_datetime(date, errors='coerce')
+    return None if pd.isna(date) else date.strftime('%Y-%m')
+
+
+def current_period():
+    return pd.Timestamp.today().strftime('%Y-%m')
+
+
+# Add (sign=1) or remove (sign=-1) one entry from a ledger's running totals
+def _apply(totals, path, entry, sign):
+    date_col, amount_col = LEDGER_FIELDS[path]
+    amount = pd.to_numeric(entry.get(amount_col), errors='coerce')
+    amount = 0.0 if pd.isna(amount) else float(amount)
+    buckets = [totals['all']]
+    period = period_of(entry.get(date_col))
+    if period is not None:
+        buckets.append(totals['periods'].setdefault(period, [0.0, 0]))
+    for bucket in buckets:
+        bucket[0] = round(bucket[0] + sign * amount, 2)
+        bucket[1] += sign
+    if period is not None and totals['periods'][period][1] == 0:
+        del totals['periods'][period]
+
+
+# Totals of a ledger from scratch (first use, or the ledger was written some other way)
+def _scan(path, df):
+    totals = {'stamp': None, 'all': [0.0, 0], 'periods': {}}
+    for entry in df.to_dict('records'):
+        _apply(totals, path, entry, 1)
+    return totals
+
+
+# Running totals of a ledger: {'all': [sum, count], 'periods': {'YYYY-MM': [sum, count]}}.
+# Stale totals are rescanned and written back unless persist is False (read-only callers
+# such as the API must not write the totals file the apps update).
+def ledger_totals(path, persist=True):
+    stamp = _stamp(path)
+    stamp = list(stamp) if stamp is not None else None
+    totals = copy.deepcopy(load_settings(LEDGER_TOTALS).get(path))
+    if totals is None or totals['stamp'] != stamp:
+        totals = _scan(path, load_ledger(path))
+        if persist:
+            _commit_totals(path, totals)
+    return totals
+
+
+def _commit_totals(path, totals):
+    stamp = _stamp(path)
+    totals['stamp'] = list(stamp) if stamp is not None else None
+    all_totals = load_settings(LEDGER_TOTALS)
+    all_totals[path] = totals
+    _write_json(LEDGER_TOTALS, all_totals)
+
+
+# (sum, count) of a ledger overall, or for one period
+def ledger_total(path, period=None, persist=True):
+    totals = ledger_totals(path, persist)
+    total, count = totals['all'] if period is None else totals['periods'].get(period, (0.0, 0))
+    return total, count
+
+
+# Write a ledger after a single-entry change and adjust its totals by that entry only
+def _save_change(path, df, totals, removed=None, added=None):
+    if removed is not None:
+        _apply(totals, path, removed, -1)
+    if added is not None:
+        _apply(totals, path, added, 1)
+    save_ledger(path, df)
+    _commit_totals(path, totals)
+
+
+# Append an entry (dict of the ledger's columns)
+def add_entry(path, entry):
+    totals = ledger_totals(path)
+    df = load_ledger(path)
+    df = pd.concat([df, pd.DataFrame([entry], columns=LEDGER_COLUMNS[path])], ignore_index=True)
+    _save_change(path, df, totals, added=entry)
+
+
+# Replace the values of the entry at `index`
+def update_entry(path, index, entry):
+    totals = ledger_totals(path)
+    df = load_ledger(path)
+    removed = df.loc[index].to_dict()
+    for col in LEDGER_COLUMNS[path]:
+        df.at[index, col] = entry[col]
+    _save_change(path, df, totals, removed=removed, added=df.loc[index].to_dict())
+
+
+# Delete the entry at `index`
+def delete_entry(path, index):
+    totals = ledger_totals(path)
+    df = load_ledger(path)
+    removed = df.loc[index].to_dict()
+    df = df.drop(index).reset_index(drop=True)
+    _save_change(path, df, totals, removed=removed)
+
+
+# Delete every entry
+def clear_ledger(path):
+    save_ledger(path, pd.DataFrame(columns=LEDGER_COLUMNS[path]))
+    _commit_totals(path, {'all': [0.0, 0], 'periods': {}})
+
+
+# Indexes of the rows edited between two versions of a ledger (dates compared as dates)
+def changed_rows(path, before, after):
+    date_col, amount_col = LEDGER_FIELDS[path]
+    frames = []
+    for df in (before, after):
+        df = df[LEDGER_COLUMNS[path]].copy()
+        df[date_col] = df[date_col].map(lambda d: pd.to_datetime(d, errors='coerce'))
+        df[amount_col] = pd.to_numeric(df[amount_col], errors='coerce')
+        frames.append(df)
+    before, after = frames
+    same = (before == after) | (before.isna() & after.isna())
+    return list(before.index[~same.all(axis=1)])
+
+
+# Grocery budget per period
+def load_budgets():
+    return load_settings(GROCERY_BUDGETS)
+
+
+# Budget of a period: its own, else carried forward from the latest earlier period,
+# else the single budget stored before budgets were kept per period
+def period_budget(period):
+    budgets = load_budgets()
+    if period in budgets:
+        return budgets[period]
+    earlier = [p for p in budgets if p < period]
+    if earlier:
+        return budgets[max(earlier)]
+    return load_settings(GROCERY_BUDGET).get('grocery_budget_key', 0.0)
+
+
+def save_budget(period, amount):
+    budgets = load_budgets()
+    budgets[period] = amount
+    _write_json(GROCERY_BUDGETS, budgets)
+
+
+# Periods with grocery entries or a budget, plus the current and the selected one (newest
+# first); the selected month stays listed after its last entry is deleted
+def budget_periods(selected=None):
+    periods = set(ledger_totals(GROCERY_EXPENSES)['periods']) | set(load_budgets()) | {current_period()}
+    if selected is not None:
+        periods.add(selected)
+    return sorted(periods, reverse=True)
+
+
+# Like sync_setting, for the budget of one period
+def sync_budget(state, period, key='grocery_budget_key'):
+    _sync(state, key, period_budget(period))
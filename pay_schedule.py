@@ -0,0 +1,137 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+INCOME_RULES = 'income_rules.json'
+
+SCHEDULES = ['semimonthly', 'biweekly', 'monthly']
+
+# Defaults reproduce the original single-payer, 1st/15th paycheck setup
+DEFAULT_INCOME_RULES = {
+    'payers': ['Defense Finance and Accounting Service'],
+    'min_amount': 0.0,
+    'schedule': 'semimonthly',
+    # semimonthly: the scheduled pay days, in Paycheck 1, Paycheck 2 order; monthly: first entry
+    'pay_days': [1, 15],
+    # biweekly: a known Paycheck 1 date (defaults to the first deposit)
+    'anchor_date': None,
+    # deposits further than this from a scheduled date do not start a cycle
+    'tolerance_days': 6,
+}
+
+
+# LOAD income rules, falling back to the defaults for missing keys
+def load_income_rules():
+    rules = dict(DEFAULT_INCOME_RULES)
+    if os.path.exists(INCOME_RULES):
+        with open(INCOME_RULES, 'r') as f:
+            try:
+                rules.update(json.load(f))
+            except json.JSONDecodeError:
+                pass
+    return rules
+
+
+# SAVE income rules
+def save_income_rules(rules):
+    with open(INCOME_RULES, 'w') as f:
+        json.dump(rules, f, indent=2)
+
+
+# Transactions that are paychecks under the rules
+def income_mask(df, rules):
+    return df['Description'].isin(rules['payers']) & (df['Amount'] >= max(rules['min_amount'], 0.01))
+
+
+# Problems that would stop the rules from labelling these transactions (empty when the rules are usable)
+def rule_errors(rules, transactions):
+    errors = []
+    if not rules['payers']:
+        errors.append('Enter at least one payer.')
+    elif not income_mask(transactions, rules).any():
+        errors.append('No deposit in the uploaded statements matches these payers and minimum amount.')
+    if not all(1 <= day <= 31 for day in rules['pay_days']):
+        errors.append('Pay days must be days of the month (1-31).')
+    if rules['anchor_date'] is not None and pd.isna(pd.to_datetime(rules['anchor_date'], errors='coerce')):
+        errors.append(f"Known Paycheck 1 date {rules['anchor_date']!r} is not a date (use YYYY-MM-DD).")
+    return errors
+
+
+# Snap each deposit date to its nearest scheduled pay date.
+# Returns the slot ordinal, the cycle number (1-based) and the slot's pay month start.
+def schedule_slots(dates, rules):
+    dates = pd.DatetimeIndex(dates)
+
+    if rules['schedule'] == 'biweekly':
+        anchor = pd.Timestamp(rules['anchor_date'] or dates.min()).normalize()
+        ordinal = np.rint((dates - anchor).days.values / 14).astype(np.int64)
+        slot_dates = anchor + pd.to_timedelta(ordinal * 14, unit='D')
+        cycle = ordinal % 2 + 1
+        # a pay month is named after the Paycheck 1 date of its pair
+        pair_start = anchor + pd.to_timedelta((ordinal - (cycle - 1)) * 14, unit='D')
+        pay_month = pair_start.to_period('M').to_timestamp()
+    else:
+        pay_days = rules['pay_days'] if rules['schedule'] == 'semimonthly' else rules['pay_days'][:1]
+        month_index = (dates.year * 12 + dates.month - 1).values.astype(np.int64)
+
+        # candidate pay dates in the previous, current and next month, as an (n, 3 * k) matrix
+        cand_month = np.concatenate([np.repeat(month_index[:, None] + offset, len(pay_days), axis=1)
+                                     for offset in (-1, 0, 1)], axis=1)
+        cand_day = np.tile(np.asarray(pay_days, dtype=np.int64), 3)
+        month_start = (cand_month - 1970 * 12).astype('datetime64[M]').astype('datetime64[D]')
+        month_len = ((month_start.astype('datetime64[M]') + 1).astype('datetime64[D]') - month_start).astype(np.int64)
+        cand_dates = month_start + (np.minimum(cand_day, month_len) - 1)
+
+        distance = np.abs(cand_dates - dates.values.astype('datetime64[D]')[:, None]).astype(np.int64)
+        best = distance.argmin(axis=1)
+        rows = np.arange(len(dates))
+
+        slot_dates = pd.DatetimeIndex(cand_dates[rows, best])
+        slot_month = cand_month[rows, best]
+        cycle = best % len(pay_days) + 1
+        ordinal = slot_month * len(pay_days) + cycle - 1
+        pay_month = slot_dates.to_period('M').to_timestamp()
+
+    within = np.abs((dates - slot_dates).days.values) <= rules['tolerance_days']
+    return ordinal, cycle, pay_month, within
+
+
+# Paycheck cycle starts: the first deposit close enough to each scheduled pay date.
+# `df` needs 'Date' (datetime), 'Description' and 'Amount'; may span several accounts.
+def cycle_starts(df, rules):
+    deposits = df.loc[income_mask(df, rules), 'Date'].sort_values(kind='stable')
+    if deposits.empty:
+        return pd.DataFrame(columns=['Date', 'Ordinal', 'Cycle', 'Pay Month'])
+
+    ordinal, cycle, pay_month, within = schedule_slots(deposits, rules)
+    starts = pd.DataFrame({'Date': deposits.values, 'Ordinal': ordinal,
+                           'Cycle': cycle, 'Pay Month': pay_month})[within]
+    return starts.drop_duplicates(subset='Ordinal', keep='first').reset_index(drop=True)
+
+
+# Label every transaction with its 'Paycheck Cycle' and 'Paycheck Year Month'.
+# Cycles are anchored on scheduled pay dates, so a missed, extra or split deposit
+# does not shift later labels; the whole history is labelled in one vectorized pass.
+# Pass `starts` to label against cycles found in other data (e.g. the paying account).
+def label_cycles(union_df, rules, starts=None):
+    union_df = union_df.sort_values(by='Date', ascending=True, kind='stable').reset_index(drop=True)
+
+    if starts is None:
+        starts = cycle_starts(union_df, rules)
+    if starts.empty:
+        union_df['Paycheck Cycle'] = None
+        union_df['Paycheck Year Month'] = None
+        return union_df
+
+    # each transaction belongs to the latest cycle start on or before its date
+    idx = np.searchsorted(starts['Date'].values, union_df['Date'].values, side='right') - 1
+    labelled = idx >= 0
+    safe_idx = np.where(labelled, idx, 0)
+
+    cycle_labels = np.array([f'Paycheck {c}' for c in starts['Cycle']], dtype=object)
+    month_labels = np.array(list(starts['Pay Month'].dt.strftime('%Y-%m')), dtype=object)
+    union_df['Paycheck Cycle'] = np.where(labelled, cycle_labels[safe_idx], None)
+    union_df['Paycheck Year Month'] = np.where(labelled, month_labels[safe_idx], None)
+    return union_df
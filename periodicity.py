@@ -0,0 +1,151 @@
+import os
+import pickle
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from ingest import store_lock
+
+PROFILE_CACHE = 'periodicity_profiles.pkl'
+# Bumped when detection changes; cached profiles of another version are recomputed
+PROFILE_VERSION = 2
+
+# Cadence name, typical days between charges, allowed deviation in days, months per cycle
+CADENCES = [
+    ('Weekly', 7, 2, None),
+    ('Biweekly', 14, 3, None),
+    ('Monthly', 30.4, 5, 1),
+    ('Bimonthly', 61, 8, 2),
+    ('Quarterly', 91, 12, 3),
+    ('Semiannual', 182, 20, 6),
+    ('Annual', 365, 30, 12),
+]
+# Cadences longer than a month are the "irregularly recurring" ones
+IRREGULAR_CADENCES = ['Bimonthly', 'Quarterly', 'Semiannual', 'Annual']
+
+# Share of gaps that must fit the cadence for a merchant to count as periodic
+MIN_REGULARITY = 0.6
+# Fewer charges than this (two gaps) are too little history to infer a cadence from
+MIN_CHARGES = 3
+# Charges at most this many days apart are one billing event (e.g. two phone lines billed separately)
+BILLING_EVENT_DAYS = 5
+# Cycle of merchants charged more than once but too rarely to infer a cadence
+INSUFFICIENT_HISTORY = 'Insufficient history'
+
+PROFILE_COLUMNS = ['Merchant', 'Cycle', 'Charges', 'Typical Cost', 'Last Charge',
+                   'Next Charge Month', 'Month', 'Regularity']
+
+MONTH_NAMES = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+
+# Infer the charge cadence of every given merchant at once from the gaps between its billing events
+def detect_periodicity(expense_data):
+    charges = expense_data[['Description', 'Date', 'Amount']].copy()
+    charges['Date'] = pd.to_datetime(charges['Date']).dt.normalize()
+    charges = charges.sort_values(by=['Description', 'Date'], kind='stable')
+    charge_counts = charges.groupby('Description').size()
+
+    # charges a few days after the previous one join its billing event (amounts add up)
+    gap = charges.groupby('Description')['Date'].diff().dt.days
+    charges['Event'] = (gap.isna() | (gap > BILLING_EVENT_DAYS)).cumsum()
+    events = charges.groupby(['Description', 'Event'], as_index=False).agg(
+        Date=('Date', 'min'), Amount=('Amount', 'sum'))
+    events['Gap'] = events.groupby('Description')['Date'].diff().dt.days
+
+    merchants = events.groupby('Description').agg(
+        Last=('Date', 'max'), Amount=('Amount', 'median'), Gap=('Gap', 'median'))
+    merchants['Charges'] = charge_counts
+
+    # cadence whose typical gap is closest to the median gap, if within its tolerance
+    days = np.array([c[1] for c in CADENCES])
+    tolerance = np.array([c[2] for c in CADENCES])
+    distance = np.abs(merchants['Gap'].values[:, None] - days[None, :])
+    best = np.nanargmin(np.where(np.isnan(distance), np.inf, distance), axis=1)
+    fits = distance[np.arange(len(merchants)), best] <= tolerance[best]
+    merchants['Cycle'] = np.where(fits, np.array([c[0] for c in CADENCES])[best], None)
+
+    # share of individual gaps that agree with the chosen cadence
+    gaps = events.dropna(subset=['Gap']).join(merchants[['Cycle']], on='Description')
+    cadence_days = gaps['Cycle'].map({c[0]: c[1] for c in CADENCES})
+    cadence_tol = gaps['Cycle'].map({c[0]: c[2] for c in CADENCES})
+    gaps['Fits'] = (gaps['Gap'] - cadence_days).abs() <= cadence_tol
+    merchants['Regularity'] = gaps.groupby('Description')['Fits'].mean()
+    merchants.loc[merchants['Regularity'] < MIN_REGULARITY, 'Cycle'] = None
+
+    # a single gap is no cadence: repeat merchants with too few charges are only marked
+    low_support = merchants['Charges'] < MIN_CHARGES
+    merchants.loc[low_support, ['Cycle', 'Regularity']] = None
+    merchants.loc[low_support & (merchants['Charges'] > 1), 'Cycle'] = INSUFFICIENT_HISTORY
+
+    periodic = merchants.dropna(subset=['Cycle']).copy()
+    step_days = periodic['Cycle'].map({c[0]: c[1] for c in CADENCES})
+    step_months = periodic['Cycle'].map({c[0]: c[3] for c in CADENCES})
+    periodic['Next'] = periodic['Last'] + pd.to_timedelta(step_days.round(), unit='D')
+    insufficient = (periodic['Cycle'] == INSUFFICIENT_HISTORY).values
+
+    return pd.DataFrame({
+        'Merchant': periodic.index,
+        'Cycle': periodic['Cycle'].values,
+        'Charges': periodic['Charges'].values,
+        'Typical Cost': periodic['Amount'].round(2).values,
+        'Last Charge': periodic['Last'].values,
+        'Next Charge Month': periodic['Next'].dt.strftime('%Y-%m').values,
+        'Month': [None if skip else _charge_months(last.month, months)
+                  for skip, last, months in zip(insufficient, periodic['Last'], step_months)],
+        'Regularity': periodic['Regularity'].astype(float).round(2).values,
+    }, columns=PROFILE_COLUMNS)
+
+
+# Calendar months a cadence charges in, e.g. 'Jan, Apr, Jul, Oct' for quarterly
+def _charge_months(last_month, step_months):
+    if pd.isna(step_months) or step_months <= 1:
+        return 'Every month'
+    step = int(step_months)
+    months = sorted({(last_month - 1 + k * step) % 12 for k in range(12 // step)})
+    return ', '.join(MONTH_NAMES[m] for m in months)
+
+
+# Per-merchant fingerprint: a profile only needs recomputing when this changes
+def _signatures(expense_data):
+    grouped = expense_data.groupby('Description')
+    return pd.DataFrame({'Count': grouped.size(), 'Last': grouped['Date'].max(),
+                         'Total': grouped['Amount'].sum().round(2)})
+
+
+# Cached profiles, updated in one batch for only the merchants with new transactions. The
+# app's worker and the inbox process both analyze, so the update runs under the store lock.
+def update_profiles(expense_data, path=PROFILE_CACHE):
+    with store_lock():
+        return _update_profiles(expense_data, path)
+
+
+def _update_profiles(expense_data, path):
+    cache = {'version': PROFILE_VERSION, 'signatures': pd.DataFrame(columns=['Count', 'Last', 'Total']),
+             'profiles': pd.DataFrame(columns=PROFILE_COLUMNS)}
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            try:
+                stored = pickle.load(f)
+            except (pickle.UnpicklingError, EOFError):
+                stored = {}
+        if stored.get('version') == PROFILE_VERSION:
+            cache = stored
+
+    signatures = _signatures(expense_data)
+    previous = cache['signatures'].reindex(signatures.index)
+    changed = signatures.index[~(previous == signatures).all(axis=1)]
+
+    if len(changed) or len(cache['signatures']) != len(signatures):
+        kept = cache['profiles']
+        kept = kept.loc[kept['Merchant'].isin(signatures.index) & ~kept['Merchant'].isin(changed)]
+        fresh = detect_periodicity(expense_data.loc[expense_data['Description'].isin(changed)])
+        frames = [df for df in (kept, fresh) if not df.empty]
+        profiles = pd.concat(frames, ignore_index=True) if frames else fresh
+        cache = {'version': PROFILE_VERSION, 'signatures': signatures, 'profiles': profiles}
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(cache, f)
+        os.replace(tmp_path, path)
+
+    return cache['profiles'].sort_values(by=['Cycle', 'Merchant']).reset_index(drop=True)
@@ -0,0 +1,122 @@
+import functools
+import re
+from difflib import SequenceMatcher
+
+import numpy as np
+import pandas as pd
+
+# Days a bank posting may differ from the hand-entered charge date
+DATE_TOLERANCE_DAYS = 5
+# Minimum merchant similarity for an amount/date match to count
+MIN_MERCHANT_SCORE = 0.5
+# Merchant name pairs whose similarity is remembered (the same few names recur across rows)
+SCORE_CACHE_SIZE = 65536
+# Room for the day number next to the amount in a combined (amount, day) sort key
+DAY_KEY_SPAN = 1 << 20
+
+LEDGER_COLUMNS = ['Ledger', 'Date', 'Merchant', 'Amount']
+
+
+# Bring a hand-entered ledger into a common shape
+def normalize_ledger(df, ledger_name, date_col, merchant_col, amount_col):
+    ledger = pd.DataFrame({
+        'Ledger': ledger_name,
+        'Date': pd.to_datetime(df[date_col], errors='coerce'),
+        'Merchant': df[merchant_col].astype(str),
+        'Amount': pd.to_numeric(df[amount_col], errors='coerce'),
+    })
+    return ledger.dropna(subset=['Date', 'Amount'])
+
+
+# Lower-case alphanumeric tokens of a merchant name
+def _tokens(name):
+    return re.findall(r'[a-z0-9]+', str(name).lower())
+
+
+# Fuzzy similarity between a ledger merchant and a bank description (0..1)
+@functools.lru_cache(maxsize=SCORE_CACHE_SIZE)
+def merchant_score(ledger_name, bank_name):
+    a, b = _tokens(ledger_name), _tokens(bank_name)
+    if not a or not b:
+        return 0.0
+    # shared words relative to the shorter name catches "Geico" vs "Geico Auto"
+    overlap = len(set(a) & set(b)) / min(len(set(a)), len(set(b)))
+    ratio = SequenceMatcher(None, ' '.join(a), ' '.join(b)).ratio()
+    return round(max(overlap, ratio), 2)
+
+
+# Ledger x bank pairs with the same amount (in integer cents) and dates within the tolerance,
+# best candidates first: closest date, then most similar merchant. Bank rows are sorted by
+# (amount, day) and each ledger row binary-searches its own +-tolerance window, so a ledger row
+# only meets the few same-amount charges near its date, never the whole same-amount group.
+def _candidates(ledger, bank, tolerance_days):
+    first_day = pd.concat([ledger['Date'], bank['Bank Date']]).min() - pd.Timedelta(days=tolerance_days)
+    ledger_days = (ledger['Date'].dt.normalize() - first_day).dt.days.values
+    bank_days = (bank['Bank Date'].dt.normalize() - first_day).dt.days.values
+
+    bank_keys = bank['Cents'].values * DAY_KEY_SPAN + bank_days
+    order = np.argsort(bank_keys, kind='stable')
+    bank_keys = bank_keys[order]
+    ledger_keys = ledger['Cents'].values * DAY_KEY_SPAN + ledger_days
+    lo = np.searchsorted(bank_keys, ledger_keys - tolerance_days, side='left')
+    hi = np.searchsorted(bank_keys, ledger_keys + tolerance_days, side='right')
+
+    # one (ledger row, bank row) pair per bank row inside each ledger row's window
+    sizes = hi - lo
+    ledger_pos = np.repeat(np.arange(len(ledger)), sizes)
+    within = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    bank_pos = order[np.repeat(lo, sizes) + within]
+
+    pairs = ledger.iloc[ledger_pos].reset_index(drop=True).join(
+        bank.drop(columns='Cents').iloc[bank_pos].reset_index(drop=True))
+    pairs['Distance'] = np.abs(ledger_days[ledger_pos] - bank_days[bank_pos])
+    pairs['Merchant Score'] = [merchant_score(l, b) for l, b in zip(pairs['Merchant'], pairs['Bank Description'])]
+    pairs = pairs.loc[pairs['Merchant Score'] >= MIN_MERCHANT_SCORE]
+    return pairs.sort_values(by=['Distance', 'Merchant Score', 'Ledger Row', 'Bank Row'],
+                             ascending=[True, False, True, True], kind='stable')
+
+
+# Match ledger entries to bank expenses one-to-one by amount, nearest date within the
+# tolerance and merchant similarity; a bank transaction is claimed by at most one entry
+def reconcile(ledgers, expense_data, tolerance_days=DATE_TOLERANCE_DAYS):
+    ledger = pd.concat(ledgers, ignore_index=True) if ledgers else pd.DataFrame(columns=LEDGER_COLUMNS)
+    ledger = ledger.astype({'Amount': 'float64', 'Date': 'datetime64[ns]'})
+    ledger = ledger.assign(**{'Ledger Row': range(len(ledger)),
+                              'Cents': (ledger['Amount'] * 100).round().astype('int64')})
+
+    bank = pd.DataFrame({
+        'Bank Row': range(len(expense_data)),
+        'Bank Date': pd.to_datetime(expense_data['Date']).values,
+        'Bank Description': expense_data['Description'].values,
+        'Cents': (expense_data['Amount'] * 100).round().astype('int64').values,
+    })
+
+    # greedy pass over the candidates (only pairs sharing an amount, so this stays small)
+    used_ledger, used_bank, chosen = set(), set(), []
+    pairs = _candidates(ledger, bank, tolerance_days)
+    for position, ledger_row, bank_row in zip(range(len(pairs)), pairs['Ledger Row'], pairs['Bank Row']):
+        if ledger_row in used_ledger or bank_row in used_bank:
+            continue
+        used_ledger.add(ledger_row)
+        used_bank.add(bank_row)
+        chosen.append(position)
+
+    pairs = pairs.iloc[chosen][['Ledger Row', 'Bank Row', 'Bank Date', 'Bank Description', 'Merchant Score']]
+    matched = ledger.merge(pairs, on='Ledger Row', how='left')
+    is_match = matched['Bank Row'].notna()
+    if not matched.loc[is_match, 'Bank Row'].is_unique:
+        raise RuntimeError('reconciliation matched a bank transaction to more than one ledger entry')
+    matched['Merchant Score'] = matched['Merchant Score'].fillna(0.0)
+
+    # entries newer than the statements (less the posting lag) may simply not have posted yet
+    posted_until = (pd.to_datetime(expense_data['Date']).max() - pd.Timedelta(days=tolerance_days)
+                    if len(expense_data) else pd.Timestamp.min)
+    not_posted = matched['Date'] > posted_until
+
+    matched['Status'] = 'Missing'
+    matched.loc[not_posted, 'Status'] = 'Pending'
+    matched.loc[is_match, 'Status'] = 'Matched'
+
+    col_order = ['Ledger', 'Date', 'Merchant', 'Amount', 'Status',
+                 'Bank Date', 'Bank Description', 'Merchant Score']
+    return matched[col_order].sort_values(by=['Ledger', 'Date'], ascending=[True, False]).reset_index(drop=True)
@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+
+from reconcile import merchant_score
+
+PERCENTILES = [5, 25, 50, 75, 95]
+
+# Stricter than reconciliation: only drop bank merchants clearly covered by a ledger entry
+LEDGER_MATCH_SCORE = 0.75
+
+
+# Per (paycheck cycle, merchant): how often the merchant charges in a cycle and the
+# per-cycle totals it charged, packed into flat arrays for vectorized sampling. Frequencies are
+# relative to the cycles in `history` (default: the given rows themselves).
+def merchant_distributions(expense_data, exclude=(), history=None):
+    expenses = expense_data.dropna(subset=['Paycheck Cycle'])
+    if exclude:
+        expenses = expenses.loc[~expenses['Description'].isin(exclude)]
+
+    per_cycle = expenses.groupby(['Paycheck Cycle', 'Description', 'Paycheck Year Month'])['Amount'].sum()
+    history = expense_data if history is None else history
+    cycles_seen = history.groupby('Paycheck Cycle')['Paycheck Year Month'].nunique()
+
+    distributions = {}
+    for cycle, totals in per_cycle.groupby(level='Paycheck Cycle'):
+        counts = totals.groupby(level='Description').size()
+        pool = totals.sort_index().values
+        distributions[cycle] = {
+            'p': (counts / cycles_seen[cycle]).clip(upper=1.0).values,
+            'counts': counts.values,
+            'offsets': np.concatenate([[0], np.cumsum(counts.values)[:-1]]),
+            'pool': pool,
+        }
+    return distributions
+
+
+# Merchants in the bank data that the hand-entered ledgers already budget for
+def ledger_merchants(expense_data, ledger_names):
+    names = set(map(str, ledger_names))
+    return [description for description in expense_data['Description'].unique()
+            if any(merchant_score(name, description) >= LEDGER_MATCH_SCORE for name in names)]
+
+
+# Paycheck cycles following the last one in the history, e.g. ('2025-03', 'Paycheck 1')
+# (none when no transaction falls in a paycheck cycle)
+def future_cycles(expense_data, months):
+    labelled = expense_data.dropna(subset=['Paycheck Cycle'])
+    if labelled.empty:
+        return []
+    cycle_types = sorted(labelled['Paycheck Cycle'].unique())
+    last = labelled.sort_values(by=['Paycheck Year Month', 'Paycheck Cycle']).iloc[-1]
+
+    month = pd.Period(last['Paycheck Year Month'], freq='M')
+    position = cycle_types.index(last['Paycheck Cycle'])
+    cycles = []
+    for _ in range(months * len(cycle_types)):
+        position += 1
+        if position == len(cycle_types):
+            position = 0
+            month += 1
+        cycles.append((str(month), cycle_types[position]))
+    return cycles
+
+
+# One cycle's total per simulation: each merchant occurs with its per-cycle probability,
+# with an amount drawn from its history
+def _draw(rng, dist, n_sims):
+    if dist is None:
+        return np.zeros(n_sims)
+    charged = rng.random((n_sims, len(dist['p']))) < dist['p']
+    idx = dist['offsets'] + (rng.random((n_sims, len(dist['p']))) * dist['counts']).astype(np.int64)
+    return (dist['pool'][idx] * charged).sum(axis=1)
+
+
+# Monte Carlo balance paths under a budget scenario.
+# Each cycle adds the configured income plus a draw of the other deposits (transfers, refunds,
+# card credits) and subtracts the planned ledger costs, the grocery budget and a draw of every
+# other merchant's spend, both drawn from their history for that cycle type. Every step is one
+# vectorized draw across all simulations.
+def simulate_balances(expense_data, start_balance, incomes, ledger_costs, ledger_names,
+                      grocery_budget, other_income=None, months=12, n_sims=10000, seed=0):
+    rng = np.random.default_rng(seed)
+    distributions = merchant_distributions(expense_data, ledger_merchants(expense_data, ledger_names))
+    inflows = merchant_distributions(other_income, history=expense_data) if other_income is not None else {}
+    cycles = future_cycles(expense_data, months)
+    if not cycles:
+        return {'overdraft_probability': 0.0,
+                'bands': pd.DataFrame(columns=['Cycle'] + [f'P{p}' for p in PERCENTILES] + ['Overdraft Probability'])}
+    cycles_per_month = len(cycles) / months
+
+    balances = np.empty((n_sims, len(cycles)))
+    balance = np.full(n_sims, float(start_balance))
+    for t, (month, cycle) in enumerate(cycles):
+        spend = _draw(rng, distributions.get(cycle), n_sims)
+        received = _draw(rng, inflows.get(cycle), n_sims)
+
+        balance = (balance + incomes.get(cycle, 0.0) + received - ledger_costs.get(cycle, 0.0)
+                   - grocery_budget / cycles_per_month - spend)
+        balances[:, t] = balance
+
+    bands = pd.DataFrame(np.percentile(balances, PERCENTILES, axis=0).T.round(2),
+                         columns=[f'P{p}' for p in PERCENTILES])
+    bands.insert(0, 'Cycle', [f'{month} {cycle}' for month, cycle in cycles])
+    bands['Overdraft Probability'] = (np.minimum.accumulate(balances, axis=1) < 0).mean(axis=0).round(4)
+
+    return {
+        'overdraft_probability': float((balances.min(axis=1) < 0).mean()),
+        'bands': bands,
+    }
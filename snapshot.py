@@ -0,0 +1,47 @@
+import csv
+import datetime
+import hashlib
+import os
+import pickle
+
+SNAPSHOT_PATH = 'dashboard_snapshot.pkl'
+TIMINGS_PATH = 'render_timings.csv'
+TIMING_COLUMNS = ['Started', 'Source', 'First Paint ms', 'Full Render ms']
+
+
+# Last rendered overview of every view (metrics and chart data), or None before the first render
+def load_snapshot(path=SNAPSHOT_PATH):
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            try:
+                return pickle.load(f)
+            except (pickle.UnpicklingError, EOFError):
+                return None
+    return None
+
+
+# Identifies the rendered content, so an unchanged overview is neither redrawn nor rewritten
+def fingerprint(state):
+    return hashlib.sha256(pickle.dumps(
+        [state['metrics'], state['balance'].values, state['spend'].values, state['key']])).hexdigest()
+
+
+# Store one view's overview next to the others (temp file + rename, like the other stores)
+def save_snapshot(view, state, path=SNAPSHOT_PATH):
+    snapshot = load_snapshot(path) or {'views': {}}
+    snapshot['views'][view] = dict(state, fingerprint=fingerprint(state))
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(snapshot, f)
+    os.replace(tmp_path, path)
+
+
+# Append one session's time-to-first-paint and full render time (seconds in, ms logged)
+def record_timing(source, first_paint, full_render, path=TIMINGS_PATH):
+    new_file = not os.path.exists(path)
+    with open(path, 'a', newline='') as f:
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(TIMING_COLUMNS)
+        writer.writerow([datetime.datetime.now().isoformat(timespec='seconds'), source,
+                         round(first_paint * 1000), round(full_render * 1000)])
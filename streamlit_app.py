@@ -1,8 +1,26 @@
-import json
+import hashlib
+import time
+
 import streamlit as st
 import pandas as pd
-import os
-import pickle
+import anomalies
+from charts import RESOLUTIONS, balance_chart_data, spend_chart_data
+from export import EXPORT_DIR
+from ingest import (clear_statements, delete_statement, load_accounts, load_anomaly_state, load_data_files,
+                    register_account)
+from ledger_store import (GROCERY_EXPENSES, PAYCHECK1_EXPENSES, PAYCHECK1_INCOME, PAYCHECK2_EXPENSES,
+                          PAYCHECK2_INCOME, add_entry, budget_periods, changed_rows, clear_ledger,
+                          current_period, delete_entry, ledger_total, ledger_totals, load_ledger,
+                          period_budget, reset_row_state, save_budget, save_setting, sync_budget,
+                          sync_setting, update_entry)
+from pay_schedule import SCHEDULES, income_mask, load_income_rules, rule_errors, save_income_rules
+from periodicity import IRREGULAR_CADENCES
+from reconcile import normalize_ledger, reconcile
+from simulator import simulate_balances
+from snapshot import fingerprint, load_snapshot, record_timing, save_snapshot
+from worker import get_worker, inputs_key, load_results
+
+render_started = time.perf_counter()
 
 # Set up the title and description
 st.title(":money_with_wings: Finance Management")
@@ -20,283 +38,181 @@ with st.sidebar.expander(':exclamation: Emergency Images'):
         st.header("An owl")
         st.image("https://static.streamlit.io/examples/owl.jpg", width=200)
 
-data_file_path = "uploaded_files.pkl"
-
-# Load existing data if available
-if os.path.exists(data_file_path):
-    with open(data_file_path, "rb") as f:
-        st.session_state['data_files'] = pickle.load(f)
-else:
-    st.session_state['data_files'] = []
+# Overview (balance, remaining budgets, running balance and spend charts). The last rendered
+# overview is shown before any statements or results are loaded, and swapped for the fresh
+# one at the end of the run only if something changed (stale-while-revalidate).
+overview = st.empty()
+
+
+def render_overview(state):
+    with overview.container():
+        st.write('### Overview')
+        cols = st.columns(len(state['metrics']))
+        for col, (label, value, delta) in zip(cols, state['metrics']):
+            col.metric(label, value, delta)
+        st.line_chart(data=state['balance'], x='Date', y='Running Total', color='#0000ff')
+        st.bar_chart(data=state['spend'], x='Date', y='Amount', color='#ff0000')
+        st.caption(f"Analytics from {state['as_of']}")
+
+
+snapshot = load_snapshot()
+shown = snapshot['views'].get(st.session_state.get('account_view', 'All accounts')) if snapshot else None
+first_paint = None
+if shown is not None:
+    render_overview(shown)
+    first_paint = time.perf_counter() - render_started
+
+# Pre-aggregated and downsampled so the chart payload stays small for long histories
+chart_resolution = st.selectbox('Chart resolution', list(RESOLUTIONS), index=1)
+
+# Background worker for ingestion and analytics (shared by all sessions)
+worker = get_worker()
+
+# Load existing data if available (statements of every account)
+accounts = load_accounts()
+st.session_state['data_files'] = load_data_files()
+
+# Load the per-merchant anomaly state, seeding it from the existing statements on first run
+anomaly_state = load_anomaly_state()
+
+# Add another account (e.g. savings or a credit card) with its own statements
+with st.sidebar.form('New Account', clear_on_submit=True):
+    st.write('Add Account')
+    new_account = st.text_input('Account name')
+    new_opening_balance = st.number_input('Opening balance', value=0.0, step=100.0)
+    if st.form_submit_button('Add') and new_account.strip():
+        try:
+            accounts = register_account(new_account.strip(), new_opening_balance)
+        except ValueError as e:
+            st.error(str(e))
 
 # Function to upload CSV files
 def upload_csv():
+    upload_account = st.selectbox('Statement account', list(accounts))
     uploaded_files = st.file_uploader("Upload CSV files", type=[
                                       "csv"], accept_multiple_files=True)
 
+    new_uploads = []
     if uploaded_files is not None:
         for file in uploaded_files:
-            # Check if the file already exists in session state
-            if any(f['file_name'] == file.name for f in st.session_state['data_files']):
+            # Check if this exact file was already stored in this account
+            # (statements are also deduplicated by content and per transaction when stored)
+            content = file.getvalue()
+            source_sha = hashlib.sha256(content).hexdigest()
+            if any(f.get('source_sha') == source_sha and f['account'] == upload_account
+                   for f in st.session_state['data_files']):
                 st.write(f"File {file.name} is already uploaded.")
                 continue  # Skip uploading this file
 
-            # Read the CSV file and process it
-            df = pd.read_csv(file)
-
-            # Append the new data to session state along with the file name
-            st.session_state['data_files'].append(
-                {"file_name": file.name, "data": df})
+            new_uploads.append((file.name, content))
 
-            # Save the updated session state to a file for persistence
-            with open(data_file_path, "wb") as f:
-                pickle.dump(st.session_state['data_files'], f)
-
-            # Display a message about successful upload
-            st.write(f"File {file.name} uploaded successfully.")
+    # Parsing, storing and analytics run in the background worker
+    if new_uploads:
+        worker.submit_ingest(new_uploads, upload_account)
 
 
 # Call the upload function
 upload_csv()
 
-# Combine all uploaded dataframes if they exist
-if 'data_files' in st.session_state and st.session_state['data_files']:
-    # Combine all DataFrames
-    union_df = pd.concat([file_info['data'] for file_info in st.session_state['data_files']]).sort_values(
-        by='Date', ascending=True).reset_index(drop=True)
-
-    # Transformations
-    union_df['Date'] = pd.to_datetime(union_df['Date'])
-    union_df['Day of Month'] = union_df['Date'].dt.day
-    union_df['Month'] = union_df['Date'].dt.month
-    union_df['Year'] = union_df['Date'].dt.year
-
-    with st.expander("Combined Data:"):
-        st.write(union_df)
-
-
-# Sort transactions in ascending order (so paycheck assignment works correctly)
-union_df = union_df.sort_values(by='Date', ascending=True)
-
-# Identify paycheck deposit dates
-paycheck_mask = union_df['Description'] == "Defense Finance and Accounting Service"
-paycheck_dates = union_df.loc[paycheck_mask, 'Date']
-
-# Initialize "Paycheck Cycle" with default value "Paycheck 1"
-union_df['Paycheck Cycle'] = None
-
-# Initialize "Paycheck Month" with NaN
-union_df['Paycheck Year Month'] = None
-
-# Process each paycheck in order
-paycheck_number = 1  # Start with Paycheck 1
-paycheck_month = None  # Store the current Paycheck Month
-
-for i, date in enumerate(paycheck_dates):
-    # Only update the paycheck month when it's the first paycheck of the month
-    if paycheck_number == 1:
-        paycheck_month = date.strftime('%Y-%m')
-
-    # Assign transactions from this paycheck onward
-    union_df.loc[union_df['Date'] >= date, ['Paycheck Cycle', 'Paycheck Year Month']] = [
-        f'Paycheck {paycheck_number}', paycheck_month]
-
-    # Alternate paycheck number for the next deposit
-    paycheck_number = 1 if paycheck_number == 2 else 2
-
-# Forward-fill the Paycheck Month for transactions before the first paycheck
-union_df['Paycheck Year Month'] = union_df['Paycheck Year Month'].ffill()
-
-# Add one month to each Paycheck Year Month
-union_df['Paycheck Year Month'] = pd.to_datetime(
-    union_df['Paycheck Year Month']) + pd.DateOffset(months=1)
-union_df['Paycheck Year Month'] = union_df['Paycheck Year Month'].dt.strftime(
-    '%Y-%m')
-
-# Reverse order back to descending
-union_df = union_df.sort_values(
-    by='Date', ascending=False).reset_index(drop=True)
-
-# expenses
-expense_data = union_df.loc[union_df.Amount < 0].reset_index(drop=True)
-expense_data.Amount = expense_data.Amount * -1
-
-# defense income
-defense_income_data = union_df.loc[union_df.Description.str.contains(
-    'Defense')].reset_index(drop=True)
-
-# all income
-income_data = union_df.loc[union_df.Amount > 0].reset_index(drop=True)
-
-# expense pivot table by paycheck month
-expense_pivot = expense_data.pivot_table(
-    index=['Paycheck Cycle', 'Paycheck Year Month'], values='Amount', aggfunc='sum')
-expense_pivot.reset_index(inplace=True)
-expense_paycheck1 = expense_pivot.loc[expense_pivot['Paycheck Cycle']
-                                      == 'Paycheck 1'].reset_index(drop=True)
-expense_paycheck2 = expense_pivot.loc[expense_pivot['Paycheck Cycle']
-                                      == 'Paycheck 2'].reset_index(drop=True)
-
-# defense income pivot table
-defense_income_pivot = pd.DataFrame(defense_income_data.pivot_table(
-    index=['Paycheck Cycle', 'Paycheck Year Month'], values='Amount', aggfunc='sum'))
-defense_income_pivot.reset_index(inplace=True)
-defense_income_paycheck1 = defense_income_pivot.loc[defense_income_pivot['Paycheck Cycle'] == 'Paycheck 1'].reset_index(
-    drop=True)
-defense_income_paycheck2 = defense_income_pivot.loc[defense_income_pivot['Paycheck Cycle'] == 'Paycheck 2'].reset_index(
-    drop=True)
-
-# Q1 ANSWER: average expense for paycheck cycle in txn data
-averge_paycheck_cycle_expenses = pd.pivot_table(
-    expense_pivot, values='Amount', index=['Paycheck Cycle'], aggfunc='mean')
-averge_paycheck_cycle_expenses.reset_index(inplace=True)
-
-# Q1 ANSWER: average expense count for paycheck cycle in txn data
-cycle_expense_counts = pd.pivot_table(expense_data, values='Amount', index=[
-                                      'Paycheck Cycle', 'Paycheck Year Month'], aggfunc='count')
-cycle_expense_counts.reset_index(inplace=True)
-cycle_expense_avg_counts = pd.pivot_table(
-    cycle_expense_counts, values='Amount', index=['Paycheck Cycle'], aggfunc='mean')
-cycle_expense_avg_counts.reset_index(inplace=True)
-
-# Q2 ANSWER: recurring and common expenses
-# obtain all expense descriptions
-expense_description = expense_data['Description'].unique()
-
-# initial a list of reucrring expense descriptions
-recurring_expense_description = []
-
-# filter the `expense_data` by each value in `expense_description`
-for description_i in expense_description:
-    # store the description to `recurring_expense_description` if it occurs in multiple transactions (rows)
-    if len(expense_data.loc[expense_data['Description'] == description_i]) >= 2:
-        recurring_expense_description.append(description_i)
-
-# filter the expense data with recurring transactions
-recurring_expenses = expense_data.loc[expense_data['Description'].isin(
-    recurring_expense_description)]
-
-# make a pivot table of the average recurring expense for each paycheck cycle (date included)
-recurring_expenses_date_included_pivot = pd.pivot_table(recurring_expenses, values=[
-                                                        'Amount'], index=['Paycheck Cycle', 'Description', 'Date'], aggfunc='mean')
-recurring_expenses_date_included_pivot.reset_index(inplace=True)
-recurring_expenses_date_included_pivot["Amount"] = round(
-    recurring_expenses_date_included_pivot["Amount"], 2)
-
-
-# make a pivot table of the average recurring expense for each day
-recurring_expenses_day_included_pivot = pd.pivot_table(recurring_expenses, values=[
-                                                       'Amount'], index=['Description', 'Day of Month', 'Month', 'Year'], aggfunc='mean')
-recurring_expenses_day_included_pivot.reset_index(inplace=True)
-recurring_expenses_day_included_pivot["Amount"] = round(
-    recurring_expenses_day_included_pivot["Amount"], 2)
-
-# make a pivot table of the average recurring expense for each paycheck cycle
-recurring_expenses_pivot = pd.pivot_table(recurring_expenses, values=[
-                                          'Amount'], index=['Paycheck Cycle', 'Description'], aggfunc='mean')
-recurring_expenses_pivot.reset_index(inplace=True)
-recurring_expenses_pivot["Amount"] = round(
-    recurring_expenses_pivot["Amount"], 2)
-
-# Group by 'Description' and aggregate to find range and amount mean
-recurring_expenses_charge_range = recurring_expenses.groupby('Description', as_index=False).agg({
-    'Day of Month': ['min', 'max'], 'Amount': 'mean'
-})
-
-# Rename columns for clarity
-recurring_expenses_charge_range.columns = [
-    'Description', 'Min Charge Day', 'Max Charge Day', 'Mean Amount']
-recurring_expenses_charge_range['Mean Amount'] = round(
-    recurring_expenses_charge_range['Mean Amount'], 2)
-
-# Display result
-recurring_expenses_charge_range['Delta'] = recurring_expenses_charge_range['Max Charge Day'] - \
-    recurring_expenses_charge_range['Min Charge Day']
-recurring_expenses_charge_range = recurring_expenses_charge_range.sort_values(
-    by=['Min Charge Day', 'Max Charge Day'], ascending=[True, True]).reset_index(drop=True)
-
-# Q3 ANSWER: sorted by expense in descending order, and description (gives insight into the frequency and magnitude of expenses in order)
-sorted_expense_data = expense_data.sort_values(by=['Paycheck Cycle', 'Amount', 'Description', 'Date'], ascending=[
-                                               True, False, True, True]).reset_index(drop=True)
-
-# Q8 ANSWER: running total amount
-union_df = union_df.sort_values(
-    by='Date', ascending=True).reset_index(drop=True)
-runner = 3400.02
-full_length = len(union_df)
-I = range(full_length)
-for i in I:
-    runner += union_df.loc[i, 'Amount']
-    union_df.loc[i, 'Running Total'] = runner
-union_df = union_df.sort_values(
-    by='Date', ascending=False).reset_index(drop=True)
-
-most_recent_income_amount = defense_income_data.loc[defense_income_data['Paycheck Year Month']
-                                                    == defense_income_data['Paycheck Year Month'].max()]
-most_recent_income = most_recent_income_amount['Amount'][:-1].values[0]
-
-info = {
-    'all_transactions': union_df,  # all transactions
-    'expenses': expense_data,  # expenses
-    'defense_income': defense_income_data,  # AF paychecks
-    'income': income_data,  # nonnegative transactions
-    'most_recent_income': most_recent_income,  # most recent paycheck
-    'expense_pivot': expense_pivot,  # sum of expenses for each paycheck, for each month
-    # Paycheck 1 avg, Paycheck 2 avg
-    'averge_paycheck_cycle_expenses': averge_paycheck_cycle_expenses,
-    # count of expenses for each paycheck
-    'cycle_expense_avg_counts': cycle_expense_avg_counts,
-    # df of transactions whose descriptions are recurring
-    'recurring_expenses': recurring_expenses,
-    # index=paycheck, description, date | amount aggfunc=mean
-    'recurring_expenses_date_included_pivot': recurring_expenses_date_included_pivot,
-    # index=paycheck, description | amount aggfunc=mean
-    'recurring_expenses_pivot': recurring_expenses_pivot,
-    # check recurring transaction descriptions and then the DAY they are made, aggregated by avergae price
-    'recurring_expense_description_day': recurring_expenses_day_included_pivot,
-    # check recurring transaction descriptions and then the range of days it has been historically charged, aggregated by avergae price
-    'recurring_expenses_charge_range': recurring_expenses_charge_range,
-    # check where bulk our expenses are going and their frequency
-    'sorted_expense_data': sorted_expense_data
-}
-
-
-# Display income vs expenses overtime
-income_mean = defense_income_data.groupby(
-    'Paycheck Cycle').agg({'Amount': 'mean'})
-income_mean['Amount'] = round(income_mean['Amount'], 2)
-income_mean = income_mean.rename(columns={"Amount": "Income"})
+# Job status and per-stage progress, polled while jobs are running
+@st.fragment(run_every=1 if worker.active_jobs() else None)
+def job_status():
+    active = worker.active_jobs()
+    for job in active:
+        label = ', '.join(job['files']) or 'Recalculating'
+        st.progress(job['progress'], text=f"{label}: {job['stage'] or 'queued'}")
+
+    for job in worker.recent_jobs():
+        if job['status'] == 'failed':
+            st.error(f"Job {job['id']} failed: {job['error']}")
+        for reason in job['rejected']:
+            st.warning(f"Skipped {reason}")
+        if job['added']:
+            st.write(f"File(s) {', '.join(job['added'])} uploaded successfully.")
+
+    # show the fresh results once the running jobs complete
+    if st.session_state.get('jobs_running') and not active:
+        st.session_state['jobs_running'] = False
+        st.rerun()
+    st.session_state['jobs_running'] = bool(active)
+
+
+job_status()
+
+income_rules = load_income_rules()
+if not st.session_state['data_files']:
+    overview.empty()
+    st.info('Upload bank statement CSV files to get started.')
+    st.stop()
+
+# Paycheck detection rules (payers, amount threshold and pay schedule), shown before the
+# analytics so rules that label no paychecks can always be corrected
+with st.sidebar.form('Income Rules'):
+    st.write('Paycheck Detection')
+    rule_payers = st.text_area('Payers (one per line)', '\n'.join(income_rules['payers']))
+    rule_min_amount = st.number_input('Minimum paycheck amount', min_value=0.0,
+                                      value=float(income_rules['min_amount']), step=100.0)
+    rule_schedule = st.selectbox('Pay schedule', SCHEDULES, index=SCHEDULES.index(income_rules['schedule']))
+    rule_pay_days = st.text_input('Pay days of month (semimonthly/monthly)',
+                                  ', '.join(str(day) for day in income_rules['pay_days']))
+    rule_anchor = st.text_input('Known Paycheck 1 date (biweekly, YYYY-MM-DD)', income_rules['anchor_date'] or '')
+    rule_tolerance = st.number_input('Tolerance (days)', min_value=0, max_value=14,
+                                     value=int(income_rules['tolerance_days']))
+    rules_submitted = st.form_submit_button('Save Rules')
+
+if rules_submitted:
+    new_rules = {
+        'payers': [payer.strip() for payer in rule_payers.splitlines() if payer.strip()],
+        'min_amount': rule_min_amount,
+        'schedule': rule_schedule,
+        'pay_days': [int(day) for day in rule_pay_days.replace(',', ' ').split() if day.isdigit()] or [1, 15],
+        'anchor_date': rule_anchor.strip() or None,
+        'tolerance_days': int(rule_tolerance),
+    }
+    # checked against every account's statements, so rules that would break the analytics are never saved
+    rule_problems = rule_errors(new_rules, pd.concat([file_info['data'] for file_info in st.session_state['data_files']]))
+    if rule_problems:
+        st.sidebar.error('Rules not saved: ' + ' '.join(rule_problems))
+    else:
+        save_income_rules(new_rules)
+        st.rerun()
 
-expense_mean = averge_paycheck_cycle_expenses.groupby(
-    'Paycheck Cycle').agg({'Amount': 'mean'})
-expense_mean["Amount"] = round(expense_mean["Amount"], 2)
-expense_mean = expense_mean.rename(columns={"Amount": "Expense"})
+# Keep showing the last completed results; recompute in the background when inputs change
+results = load_results()
+current_key = inputs_key(st.session_state['data_files'], income_rules, accounts)
+if results is None or results['key'] != current_key:
+    job = worker.submit_recompute(current_key)
+    if results is None:
+        # nothing to show yet, so wait for the first run
+        with st.spinner('Running analytics for the first time...'):
+            job = worker.wait(job['id'])
+        results = load_results()
+        if results is None:
+            overview.empty()
+            st.error(f"Analytics failed: {job['error']}")
+            st.stop()
+
+# Consolidated household view, or a single account's own tables
+account_view = st.sidebar.selectbox('View', ['All accounts'] + list(results['accounts']), key='account_view')
+info = results['info'] if account_view == 'All accounts' else results['accounts'][account_view]
+union_df = info['all_transactions']
+expense_data = info['expenses']
+most_recent_income = info['most_recent_income']
+recurring_expenses_charge_range = info['recurring_expenses_charge_range']
+income_expense_mean = info['income_expense_mean']
+income_expense_ym = info['income_expense_ym']
+
+if info['income_warning']:
+    st.warning(info['income_warning'])
+
+with st.expander("Combined Data:"):
+    st.write(union_df)
+
+st.sidebar.caption(f"Analytics from {results['completed_at']}, tables exported to `{EXPORT_DIR}/`")
 
-income_expense_mean = pd.merge(
-    income_mean, expense_mean, on=["Paycheck Cycle"])
-income_expense_mean['Delta'] = income_expense_mean['Income'] - \
-    income_expense_mean["Expense"]
 with st.expander('Income and expense average to date'):
     income_expense_mean
 
-# Display income vs expenses for each Paycheck Year Month
-income_data_ym = defense_income_data.groupby(
-    ['Paycheck Year Month', 'Paycheck Cycle']).agg({'Amount': 'sum'})
-income_data_ym['Amount'] = round(income_data_ym['Amount'], 2)
-income_data_ym = income_data_ym.rename(columns={'Amount': 'Income'})
-
-expense_sum_ym = expense_data.groupby(
-    ['Paycheck Year Month', 'Paycheck Cycle']).agg({'Amount': 'sum'})
-expense_sum_ym['Amount'] = round(expense_sum_ym['Amount'], 2)
-expense_sum_ym = expense_sum_ym.rename(columns={'Amount': 'Expense'})
-
-income_expense_ym = pd.merge(expense_sum_ym, income_data_ym, on=[
-                             "Paycheck Year Month", 'Paycheck Cycle'])
-income_expense_ym['Delta'] = income_expense_ym['Income'] - \
-    income_expense_ym['Expense']
-income_expense_ym = income_expense_ym.sort_values(
-    ['Paycheck Year Month', 'Paycheck Cycle'], ascending=[False, True])
-
 with st.expander('Total expenses and income for each paycheck interval to date'):
     income_expense_ym
 
@@ -308,18 +224,21 @@ with st.expander('All expenses'):
     col_order = ['Day of Month', 'Paycheck Year Month', 'Paycheck Cycle', 'Description', 'Amount']
     st.dataframe(expense_data[col_order])
 
-# Display irregular recurring expenses
+with st.expander('Flagged transactions'):
+    st.dataframe(anomalies.flagged_table(anomaly_state))
+
+# Display irregular recurring expenses (cadences inferred from the charge history)
 with st.expander('Irregularly Recurring Details'):
-    irreg_exp = {
-        'Cycle': ['Quarterly', 'Quarterly', 'Bimonthly', 'Annual', 'Annual', 'Annual'],
-        'Merchant': ['Mint (C)', 'Mint (R)', 'Anti-Pest', 'Google Cloud 200 GB (R)', 'Chat GPT', 'Walmart+'], 
-        'Cost': [120.00, 120.00, 80.00, 30.89, 39.99, 98.00],
-        'Month': ['Jan, Apr, Jul, Oct', 'Jan, Apr, Jul, Oct', 'Jan, Mar, May, Jul, Sep, Nov', 'Jul', 'Jul', 'May']
-    }
-    irreg_exp_df = pd.DataFrame(irreg_exp)
-    col_order_ir_exp = ['Cycle', 'Merchant','Month']
+    # cadences are inferred household-wide; keep the merchants seen in the viewed account
+    merchant_cadence = results['info']['merchant_cadence']
+    merchant_cadence = merchant_cadence.loc[merchant_cadence['Merchant'].isin(expense_data['Description'])]
+    irreg_exp_df = merchant_cadence.loc[merchant_cadence['Cycle'].isin(IRREGULAR_CADENCES)]
+    col_order_ir_exp = ['Cycle', 'Merchant', 'Month', 'Typical Cost', 'Next Charge Month']
     st.dataframe(irreg_exp_df[col_order_ir_exp])
 
+with st.expander('All detected charge cadences'):
+    st.dataframe(merchant_cadence)
+
 # Display irregular recurring expenses navigation
 with st.expander('Irregularly Recurring Navigation'):
     irreg_exp_nav = {
@@ -355,106 +274,32 @@ st.bar_chart(data=income_expense_ym2, x="Paycheck Year Month", y=[
              "Expense", "Income"], stack='layered', color=['#ff0000', '#0000ff'])
 
 
-PAYCHECK1_EXPENSES = "paycheck1_expenses.csv"
-PAYCHECK2_EXPENSES = "second_paycheck_expenses.csv"
-PAYCHECK1_INCOME = 'paycheck1_income.json'
-PAYCHECK2_INCOME = 'paycheck2_income.json'
-GROCERY_BUDGET = 'grocery_budget.csv'
-GROCERY_EXPENSES = 'grocery_expenses.csv'
-
-# Load data from CSV
-def load_data():
-    return pd.read_csv(PAYCHECK1_EXPENSES) if os.path.exists(PAYCHECK1_EXPENSES) else pd.DataFrame(columns=['txn', 'cost', 'd'])
-
-# Save data to CSV
-def save_data():
-    st.session_state.paycheck1_expenses.to_csv(PAYCHECK1_EXPENSES, index=False)
-
-# Load second paycheck expenses data
-def load_second_paycheck_data():
-    return pd.read_csv(PAYCHECK2_EXPENSES) if os.path.exists(PAYCHECK2_EXPENSES) else pd.DataFrame(columns=['txn', 'cost', 'd'])
-
-# Save second paycheck expenses data
-def save_second_paycheck_data():
-    st.session_state.second_paycheck_expenses.to_csv(PAYCHECK2_EXPENSES, index=False)
-
-# Load grocery data
-def load_grocery_expense_data():
-    return pd.read_csv(GROCERY_EXPENSES) if os.path.exists(GROCERY_EXPENSES) else pd.DataFrame(columns=['date', 'store', 'amount'])
-
-# Save grocery data
-def save_grocery_expense_data():
-    st.session_state.grocery_expense_data.to_csv(GROCERY_EXPENSES, index=False)
-
-# Load income data (ensure it's a float)
-def load_paycheck1():
-    if os.path.exists(PAYCHECK1_INCOME):
-        with open(PAYCHECK1_INCOME, 'r') as f:
-            try:
-                return json.load(f)
-            except json.JSONDecodeError:
-                return {}
-    return {}
-
 # SAVE Paycheck 1 INCOME
 def save_paycheck1():
-    with open(PAYCHECK1_INCOME, 'w') as f:
-        json.dump({'paycheck1_key': st.session_state.paycheck1_key}, f)
-
-# LOAD Paycheck 2 INCOME
-def load_paycheck2():
-    if os.path.exists(PAYCHECK2_INCOME):
-        with open(PAYCHECK2_INCOME, 'r') as f:
-            try:
-                return json.load(f)
-            except json.JSONDecodeError:
-                return {}
-    return {}
+    save_setting(PAYCHECK1_INCOME, 'paycheck1_key', st.session_state.paycheck1_key)
 
 # SAVE Paycheck 2 INCOME
 def save_paycheck2():
-    with open(PAYCHECK2_INCOME, 'w') as f:
-        json.dump({'paycheck2_key': st.session_state.paycheck2_key}, f)
-
-# LOAD Grocery Budget
-def load_groc_budget():
-    if os.path.exists(GROCERY_BUDGET):
-        with open(GROCERY_BUDGET, 'r') as f:
-            try:
-                return json.load(f)
-            except json.JSONDecodeError:
-                return {}
-    return {}
-
-# SAVE Grocery Budget
-def save_groc_budget():
-    with open(GROCERY_BUDGET, 'w') as f:
-        json.dump({'grocery_budget_key': st.session_state.grocery_budget_key}, f)
-
-# Initialize session state
-if 'paycheck1_expenses' not in st.session_state:
-    st.session_state.paycheck1_expenses = load_data()
+    save_setting(PAYCHECK2_INCOME, 'paycheck2_key', st.session_state.paycheck2_key)
 
-if 'second_paycheck_expenses' not in st.session_state:
-    st.session_state.second_paycheck_expenses = load_second_paycheck_data()
-
-if 'grocery_expense_data' not in st.session_state:
-    st.session_state.grocery_expense_data = load_grocery_expense_data()
-
-session_paycheck1 = load_paycheck1()
-st.session_state.setdefault(
-    'paycheck1_key', session_paycheck1.get('paycheck1_key', 0.0)
-    )
-
-session_paycheck2 = load_paycheck2()
-st.session_state.setdefault(
-    'paycheck2_key', session_paycheck2.get('paycheck2_key', 0.0)
-    )
-
-session_grocery = load_groc_budget()
-st.session_state.setdefault(
-    'grocery_budget_key', session_grocery.get('grocery_budget_key', 0.0)
-    )
+# SAVE Grocery Budget (for the selected month)
+def save_groc_budget():
+    save_budget(st.session_state.get('grocery_period', current_period()), st.session_state.grocery_budget_key)
+
+# Load ledgers and settings from the shared store (cached, re-read only when a file changes,
+# including changes saved by the grocery budget app)
+st.session_state.paycheck1_expenses = load_ledger(PAYCHECK1_EXPENSES)
+st.session_state.second_paycheck_expenses = load_ledger(PAYCHECK2_EXPENSES)
+st.session_state.grocery_expense_data = load_ledger(GROCERY_EXPENSES)
+reset_row_state(st.session_state, PAYCHECK1_EXPENSES, ('txn', 'cost', 'date'))
+reset_row_state(st.session_state, PAYCHECK2_EXPENSES, ('txn2', 'cost2', 'date2'))
+reset_row_state(st.session_state, GROCERY_EXPENSES, ('txn3', 'cost3', 'date3'))
+
+sync_setting(st.session_state, PAYCHECK1_INCOME, 'paycheck1_key')
+sync_setting(st.session_state, PAYCHECK2_INCOME, 'paycheck2_key')
+# Grocery budgets are kept per month; the selected month defaults to the current one
+grocery_period = st.session_state.get('grocery_period', current_period())
+sync_budget(st.session_state, grocery_period)
 
 # User sets their income (persists across sessions, but defaults to `most_recent_income`)
 st.sidebar.header("Income Settings")
@@ -476,21 +321,19 @@ st.sidebar.number_input(
     on_change=save_paycheck2
 )
 
-# Calculate total cost of paycheck1_expenses and second paycheck expenses
-paycheck1_total_expenses = st.session_state.paycheck1_expenses['cost'].sum(
-) if not st.session_state.paycheck1_expenses.empty else 0
-paycheck2_total_expense = st.session_state.second_paycheck_expenses['cost'].sum(
-) if not st.session_state.second_paycheck_expenses.empty else 0
+# Total cost of paycheck1_expenses and second paycheck expenses
+# (running totals kept up to date on every add/edit/delete, so these are lookups)
+paycheck1_total_expenses, _ = ledger_total(PAYCHECK1_EXPENSES)
+paycheck2_total_expense, _ = ledger_total(PAYCHECK2_EXPENSES)
 
-# Calculate total cost of groceries so far
-grocery_total_expenses = st.session_state.grocery_expense_data['amount'].sum(
-) if not st.session_state.grocery_expense_data.empty else 0
+# Total cost of groceries in the selected month
+grocery_total_expenses, _ = ledger_total(GROCERY_EXPENSES, grocery_period)
 
 # Remaining balance for first and second paycheck
 remaining_balance_first_paycheck = st.session_state.paycheck1_key - paycheck1_total_expenses
 remaining_balance_second_paycheck = st.session_state.paycheck2_key - paycheck2_total_expense
 
-# Remaining balance for grocery budget
+# Remaining balance for the month's grocery budget
 remaining_grocery_budget = st.session_state.grocery_budget_key - grocery_total_expenses
 
 st.write("### Paycheck 1 Expenses")
@@ -507,10 +350,7 @@ with st.form('New Subscription'):
     submitted = st.form_submit_button("Submit")
 
 if submitted and txn:
-    new_entry = pd.DataFrame([[txn, cost, d]], columns=['txn', 'cost', 'd'])
-    st.session_state.paycheck1_expenses = pd.concat(
-        [st.session_state.paycheck1_expenses, new_entry], ignore_index=True)
-    save_data()
+    add_entry(PAYCHECK1_EXPENSES, {'txn': txn, 'cost': cost, 'd': d})
     st.rerun()
 
 # # Display subscription list for Paycheck 1
@@ -591,21 +431,17 @@ for index, row in st.session_state.paycheck1_expenses.iterrows():
 
     # Delete button
     if col4.button("❌", key=f"del_{index + 1}"):
-        updated_expenses.drop(index, inplace=True)
-        updated_expenses.reset_index(drop=True, inplace=True)
-        st.session_state.paycheck1_expenses = updated_expenses
-        save_data()
+        delete_entry(PAYCHECK1_EXPENSES, index)
         st.rerun()
 
-# Save updates back to session state if there are changes
-if not updated_expenses.equals(st.session_state.paycheck1_expenses):
-    st.session_state.paycheck1_expenses = updated_expenses
-    save_data()
+# Save edited rows (the running totals are adjusted by each row's change)
+for index in changed_rows(PAYCHECK1_EXPENSES, st.session_state.paycheck1_expenses, updated_expenses):
+    update_entry(PAYCHECK1_EXPENSES, index, updated_expenses.loc[index])
+st.session_state.paycheck1_expenses = updated_expenses
 
 
 if st.button("Clear All Paycheck 1 Expenses"):
-    st.session_state.paycheck1_expenses = pd.DataFrame(columns=['txn', 'cost', 'd'])
-    save_data()
+    clear_ledger(PAYCHECK1_EXPENSES)
     st.rerun()
 
 # Second Paycheck Expenses Form
@@ -623,11 +459,7 @@ with st.form('New Second Paycheck Expense'):
     submitted_2 = st.form_submit_button("Submit (Paycheck 2)")
 
 if submitted_2 and txn_2:
-    new_entry_2 = pd.DataFrame(
-        [[txn_2, cost_2, d_2]], columns=['txn', 'cost', 'd'])
-    st.session_state.second_paycheck_expenses = pd.concat(
-        [st.session_state.second_paycheck_expenses, new_entry_2], ignore_index=True)
-    save_second_paycheck_data()
+    add_entry(PAYCHECK2_EXPENSES, {'txn': txn_2, 'cost': cost_2, 'd': d_2})
     st.rerun()
 
 # # Display second paycheck expense list
@@ -684,26 +516,23 @@ for index, row in st.session_state.second_paycheck_expenses.iterrows():
 
     # Delete button
     if col4.button("❌", key=f"del2_{index + 1}"):
-        updated_expenses.drop(index, inplace=True)
-        updated_expenses.reset_index(drop=True, inplace=True)
-        st.session_state.second_paycheck_expenses = updated_expenses
-        save_second_paycheck_data()
+        delete_entry(PAYCHECK2_EXPENSES, index)
         st.rerun()
 
-# Save updates back to session state if there are changes
-if not updated_expenses.equals(st.session_state.second_paycheck_expenses):
-    st.session_state.second_paycheck_expenses = updated_expenses
-    save_second_paycheck_data()
+# Save edited rows (the running totals are adjusted by each row's change)
+for index in changed_rows(PAYCHECK2_EXPENSES, st.session_state.second_paycheck_expenses, updated_expenses):
+    update_entry(PAYCHECK2_EXPENSES, index, updated_expenses.loc[index])
+st.session_state.second_paycheck_expenses = updated_expenses
 
 # Button to clear all second paycheck expenses
 if st.button("Clear All Paycheck 2 Expenses"):
-    st.session_state.second_paycheck_expenses = pd.DataFrame(
-        columns=['txn', 'cost', 'd'])
-    save_second_paycheck_data()
+    clear_ledger(PAYCHECK2_EXPENSES)
     st.rerun()
 
 # Grocery
 st.write('### Grocery Budget')
+grocery_periods = budget_periods(grocery_period)
+st.selectbox('Budget month', grocery_periods, index=grocery_periods.index(grocery_period), key='grocery_period')
 # Budget decision input
 st.number_input(
     'Decision',
@@ -720,6 +549,13 @@ st.metric(
     delta=f'-${grocery_total_expenses:,.2f}'
           )
 
+# Earlier months straight from the per-month totals
+with st.expander('Grocery spend by month'):
+    grocery_months = ledger_totals(GROCERY_EXPENSES)['periods']
+    st.dataframe(pd.DataFrame(
+        [(period, *grocery_months.get(period, (0.0, 0)), period_budget(period)) for period in grocery_periods],
+        columns=['Month', 'Spent', 'Entries', 'Budget']).assign(Remaining=lambda df: df['Budget'] - df['Spent']))
+
 # Grocery Form
 st.write('Grocery Expense List')
 with st.form('New Grocery Expense'):
@@ -730,13 +566,7 @@ with st.form('New Grocery Expense'):
     submit = st.form_submit_button('Submit Expense')
 
 if submit and store:
-    nw_entry = pd.DataFrame(
-        [[dt, store, costt]], columns=['date', 'store', 'amount']
-    )
-    st.session_state.grocery_expense_data = pd.concat(
-        [st.session_state.grocery_expense_data, nw_entry], ignore_index=True
-    )
-    save_grocery_expense_data()
+    add_entry(GROCERY_EXPENSES, {'date': dt, 'store': store, 'amount': costt})
     st.rerun()
 
 # # Display second paycheck expense list
@@ -791,23 +621,72 @@ for index, row in st.session_state.grocery_expense_data.iterrows():
 
     # Delete button
     if col4.button("❌", key=f"del3_{index}"):
-        updated_expenses.drop(index, inplace=True)
-        updated_expenses.reset_index(drop=True, inplace=True)
-        st.session_state.grocery_expense_data = updated_expenses
-        save_grocery_expense_data()
+        delete_entry(GROCERY_EXPENSES, index)
         st.rerun()
 
-# Save updates back to session state if there are changes
-if not updated_expenses.equals(st.session_state.grocery_expense_data):
-    st.session_state.grocery_expense_data = updated_expenses
-    save_grocery_expense_data()
+# Save edited rows (the running totals are adjusted by each row's change)
+for index in changed_rows(GROCERY_EXPENSES, st.session_state.grocery_expense_data, updated_expenses):
+    update_entry(GROCERY_EXPENSES, index, updated_expenses.loc[index])
+st.session_state.grocery_expense_data = updated_expenses
 # Button to clear all second paycheck expenses
 if st.button("Clear All Grocery Expenses"):
-    st.session_state.grocery_expense_data = pd.DataFrame(
-        columns=['date', 'store', 'amount'])
-    save_grocery_expense_data()
+    clear_ledger(GROCERY_EXPENSES)
     st.rerun()
 
+# Cached per scenario, so reruns with unchanged inputs skip the simulation
+@st.cache_data(max_entries=32, show_spinner='Simulating balances...')
+def run_scenario(expense_data, start_balance, incomes, ledger_costs, ledger_names, grocery_budget, other_income,
+                 months, n_sims):
+    return simulate_balances(expense_data, start_balance, incomes, ledger_costs, ledger_names,
+                             grocery_budget, other_income, months=months, n_sims=n_sims)
+
+# What-if simulation of future balances under the current incomes, ledgers and grocery budget
+st.write('### What-if Balance Simulator')
+col1, col2 = st.columns(2)
+sim_months = col1.slider('Months ahead', min_value=1, max_value=24, value=12)
+sim_paths = col2.selectbox('Simulated paths', [1000, 10000, 50000], index=1)
+current_balance = round(float(union_df['Running Total'].iloc[union_df['Date'].argmax()]), 2)
+scenario = run_scenario(
+    expense_data,
+    current_balance,
+    {'Paycheck 1': st.session_state.paycheck1_key, 'Paycheck 2': st.session_state.paycheck2_key},
+    {'Paycheck 1': paycheck1_total_expenses, 'Paycheck 2': paycheck2_total_expense},
+    tuple(st.session_state.paycheck1_expenses['txn']) + tuple(st.session_state.second_paycheck_expenses['txn'])
+    + tuple(st.session_state.grocery_expense_data['store'].dropna()),
+    st.session_state.grocery_budget_key,
+    # deposits other than the paychecks configured above (transfers, refunds, card credits)
+    info['income'].loc[~income_mask(info['income'], income_rules)],
+    sim_months,
+    sim_paths,
+)
+st.metric('Probability of Overdraft', f"{scenario['overdraft_probability']:.1%}")
+st.line_chart(data=scenario['bands'], x='Cycle', y=['P5', 'P25', 'P50', 'P75', 'P95'])
+with st.expander('Simulated balance percentiles by paycheck cycle'):
+    st.dataframe(scenario['bands'])
+
+# Cached per ledger contents and analytics run (the viewed account's expenses are identified by
+# the results key and the view, so the bank table itself is not hashed on every rerun)
+@st.cache_data(max_entries=8, show_spinner=False)
+def reconcile_ledgers(paycheck1_expenses, second_paycheck_expenses, grocery_expense_data, results_key, view,
+                      _expense_data):
+    return reconcile([
+        normalize_ledger(paycheck1_expenses, 'Paycheck 1', 'd', 'txn', 'cost'),
+        normalize_ledger(second_paycheck_expenses, 'Paycheck 2', 'd', 'txn', 'cost'),
+        normalize_ledger(grocery_expense_data, 'Grocery', 'date', 'store', 'amount'),
+    ], _expense_data)
+
+# Reconcile the hand-entered ledgers against the uploaded bank statements
+st.write('### Ledger Reconciliation')
+reconciled = reconcile_ledgers(st.session_state.paycheck1_expenses, st.session_state.second_paycheck_expenses,
+                               st.session_state.grocery_expense_data, results['key'], account_view, expense_data)
+status_counts = reconciled['Status'].value_counts()
+col1, col2, col3 = st.columns(3)
+col1.metric('Matched', int(status_counts.get('Matched', 0)))
+col2.metric('Pending', int(status_counts.get('Pending', 0)))
+col3.metric('Missing', int(status_counts.get('Missing', 0)))
+with st.expander('Ledger entries vs bank transactions'):
+    st.dataframe(reconciled)
+
 st.write('Grocery Budget App: https://grocery-budget-9n4dqk3iap.streamlit.app/')
 
 # Sidebar for managing uploaded files
@@ -824,22 +703,49 @@ if 'data_files' in st.session_state and st.session_state['data_files']:
         col1, col2 = st.sidebar.columns([4, 1])
 
         with col1:
-            st.write(file_name)
+            st.write(f"{file_name} ({file_info['account']})")
 
         with col2:
             # Create a unique key for each button to avoid conflicts
             if st.button(f":x:", key=f"delete_{i}"):
                 st.session_state['data_files'].pop(i)
-                # Save the updated session state to persistent storage
-                with open(data_file_path, "wb") as f:
-                    pickle.dump(st.session_state['data_files'], f)
+                # Remove it from persistent storage and rebuild the merchant stats without it
+                delete_statement(file_info['account'], file_name)
                 st.sidebar.write(f"{file_name} deleted.")
                 break  # Ensure only one file is deleted at a time
 
     # Option to clear all files
     if st.sidebar.button("Clear All Files"):
         st.session_state['data_files'] = []
-        # Save the empty list to persistent storage
-        with open(data_file_path, "wb") as f:
-            pickle.dump(st.session_state['data_files'], f)
+        # Clear persistent storage
+        clear_statements()
         st.sidebar.write("All files cleared.")
+
+# Revalidate the overview against the fresh results: redraw and store it only if it changed
+live_overview = {
+    'key': results['key'],
+    'as_of': results['completed_at'],
+    'metrics': [
+        ('Balance', f'${current_balance:,.2f}', None),
+        ('Last Paycheck', f'${most_recent_income:,.2f}', None),
+        ('Paycheck 1 Left', f'${remaining_balance_first_paycheck:,.2f}', None),
+        ('Paycheck 2 Left', f'${remaining_balance_second_paycheck:,.2f}', None),
+        ('Groceries Left', f'${remaining_grocery_budget:,.2f}', None),
+        ('Overdraft Risk', f"{scenario['overdraft_probability']:.1%}", None),
+    ],
+    'balance': balance_chart_data(union_df, chart_resolution),
+    'spend': spend_chart_data(expense_data, chart_resolution),
+}
+if shown is None or shown['fingerprint'] != fingerprint(live_overview):
+    render_overview(live_overview)
+    save_snapshot(account_view, live_overview)
+if first_paint is None:
+    # no snapshot yet: the overview first appears now
+    first_paint = time.perf_counter() - render_started
+
+# Time to first paint (overview on screen) vs the full run, logged once per session
+full_render = time.perf_counter() - render_started
+if 'render_timed' not in st.session_state:
+    st.session_state['render_timed'] = True
+    record_timing('snapshot' if shown is not None else 'live', first_paint, full_render)
+st.sidebar.caption(f'First paint {first_paint * 1000:.0f} ms, full render {full_render * 1000:.0f} ms')
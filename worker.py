@@ -0,0 +1,369 @@
+import datetime
+import hashlib
+import json
+import multiprocessing
+import os
+import pickle
+import queue
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from analytics import build_info, merge_infos
+from export import export_info
+from ingest import DEFAULT_ACCOUNT, add_statements, load_accounts, load_data_files, parse_statement
+from pay_schedule import cycle_starts, load_income_rules
+from periodicity import update_profiles
+
+JOBS_DIR = 'jobs'
+RESULTS_PATH = 'analytics_results.pkl'
+# Bumped whenever the tables in the results change shape; older results are recomputed
+ANALYTICS_VERSION = 5
+
+# Below this many statement rows the accounts are analyzed serially: a partition builds in tens
+# of milliseconds, less than handing it to another process and pickling the tables back
+PARALLEL_MIN_ROWS = 100_000
+
+# A failed recompute of unchanged inputs is not retried before this many seconds
+RECOMPUTE_RETRY_SECONDS = 600
+
+# Finished job records are kept this long (status messages, repeat-upload dedup), then deleted
+JOB_RETENTION_DAYS = 7
+
+# Stages run by each kind of job, in order
+STAGES = {
+    'ingest': ['parse', 'store', 'analyze'],
+    'recompute': ['analyze'],
+}
+
+
+# Identifies the analytics inputs: which statements are loaded into which account,
+# the accounts' opening balances and the income rules
+def inputs_key(data_files, income_rules, accounts):
+    names = [[file_info['account'], file_info['file_name']] for file_info in data_files]
+    payload = json.dumps([names, accounts, income_rules], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+# Last completed analytics results, or None before the first run
+def load_results(path=RESULTS_PATH):
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            results = pickle.load(f)
+        if results.get('version') == ANALYTICS_VERSION:
+            return results
+    return None
+
+
+# Written under a unique temp name: the app's worker and the inbox process both publish results
+def _save_results(results, path=RESULTS_PATH):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        pickle.dump(results, f)
+    os.replace(tmp_path, path)
+
+
+def _now():
+    return datetime.datetime.now().isoformat(timespec='seconds')
+
+
+# In-process job queue: one daemon thread runs ingestion and recomputation stage by stage.
+# Job records and staged uploads live under `jobs/`, so unfinished jobs resume after a restart.
+class Worker:
+    def __init__(self, jobs_dir=JOBS_DIR):
+        self.jobs_dir = jobs_dir
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.queue = queue.Queue()
+        os.makedirs(jobs_dir, exist_ok=True)
+        self._resume()
+        self.thread = threading.Thread(target=self._run, name='finance-worker', daemon=True)
+        self.thread.start()
+
+    # Queue parsing + storing + analytics for uploaded (file name, bytes) pairs into an account
+    def submit_ingest(self, uploads, account=DEFAULT_ACCOUNT):
+        digest = hashlib.sha256(account.encode())
+        for file_name, content in uploads:
+            digest.update(file_name.encode())
+            digest.update(content)
+        job_id = f'ingest-{digest.hexdigest()[:16]}'
+
+        with self.lock:
+            existing = self.jobs.get(job_id)
+            # the same files are only ingested once
+            if existing is not None and existing['status'] != 'failed':
+                return dict(existing)
+
+            staged_dir = os.path.join(self.jobs_dir, job_id)
+            os.makedirs(staged_dir, exist_ok=True)
+            for i, (file_name, content) in enumerate(uploads):
+                with open(os.path.join(staged_dir, f'{i}.csv'), 'wb') as f:
+                    f.write(content)
+
+            record = self._new_record(job_id, 'ingest', [file_name for file_name, _ in uploads])
+            record['account'] = account
+            return self._enqueue(record)
+
+    # Queue an analytics run for the given inputs key
+    # A recompute that failed for these inputs is retried only after RECOMPUTE_RETRY_SECONDS, so
+    # the app's reruns keep showing the failure instead of resubmitting it every time
+    def submit_recompute(self, key):
+        job_id = f'recompute-{key[:16]}'
+        retry_after = (datetime.datetime.now() - datetime.timedelta(seconds=RECOMPUTE_RETRY_SECONDS)).isoformat(
+            timespec='seconds')
+        with self.lock:
+            existing = self.jobs.get(job_id)
+            if existing is not None and (existing['status'] in ('queued', 'running') or (
+                    existing['status'] == 'failed' and existing['finished_at'] > retry_after)):
+                return dict(existing)
+            return self._enqueue(self._new_record(job_id, 'recompute', []))
+
+    def job(self, job_id):
+        with self.lock:
+            record = self.jobs.get(job_id)
+            return dict(record) if record is not None else None
+
+    # Jobs that are queued or running
+    def active_jobs(self):
+        with self.lock:
+            return [dict(r) for r in self.jobs.values() if r['status'] in ('queued', 'running')]
+
+    # Jobs finished within the last `seconds`
+    def recent_jobs(self, seconds=3600):
+        cutoff = (datetime.datetime.now() - datetime.timedelta(seconds=seconds)).isoformat(timespec='seconds')
+        with self.lock:
+            return [dict(r) for r in self.jobs.values()
+                    if r['status'] in ('done', 'failed') and r['finished_at'] >= cutoff]
+
+    # Block until a job finishes (used only when there are no results to show yet)
+    def wait(self, job_id, timeout=None):
+        start = time.monotonic()
+        while True:
+            record = self.job(job_id)
+            if record is None or record['status'] in ('done', 'failed'):
+                return record
+            if timeout is not None and time.monotonic() - start > timeout:
+                return record
+            time.sleep(0.1)
+
+    def _new_record(self, job_id, kind, files):
+        return {
+            'id': job_id,
+            'kind': kind,
+            'files': files,
+            'status': 'queued',
+            'stage': None,
+            'progress': 0.0,
+            'stages_done': [],
+            'rejected': [],
+            'added': [],
+            'error': None,
+            'created_at': _now(),
+            'finished_at': None,
+        }
+
+    def _enqueue(self, record):
+        self.jobs[record['id']] = record
+        self._persist(record)
+        self.queue.put(record['id'])
+        return dict(record)
+
+    def _persist(self, record):
+        path = os.path.join(self.jobs_dir, f"{record['id']}.json")
+        with open(path + '.tmp', 'w') as f:
+            json.dump(record, f, indent=2)
+        os.replace(path + '.tmp', path)
+
+    def _update(self, job_id, **changes):
+        with self.lock:
+            record = self.jobs[job_id]
+            record.update(changes)
+            self._persist(record)
+
+    # Re-queue jobs that were interrupted by a restart; completed stages are skipped
+    def _resume(self):
+        for name in sorted(os.listdir(self.jobs_dir)):
+            if not name.endswith('.json'):
+                continue
+            with open(os.path.join(self.jobs_dir, name), 'r') as f:
+                try:
+                    record = json.load(f)
+                except json.JSONDecodeError:
+                    continue
+            self.jobs[record['id']] = record
+            if record['status'] in ('queued', 'running'):
+                record['status'] = 'queued'
+                self.queue.put(record['id'])
+            else:
+                self._discard_staged(record['id'])
+        self._prune()
+
+    # Staged uploads (raw bank data) are only needed until their job finishes
+    def _discard_staged(self, job_id):
+        shutil.rmtree(os.path.join(self.jobs_dir, job_id), ignore_errors=True)
+
+    # Delete records of jobs that finished more than JOB_RETENTION_DAYS ago
+    def _prune(self):
+        cutoff = (datetime.datetime.now() - datetime.timedelta(days=JOB_RETENTION_DAYS)).isoformat(timespec='seconds')
+        with self.lock:
+            expired = [job_id for job_id, record in self.jobs.items()
+                       if record['status'] in ('done', 'failed') and record['finished_at'] < cutoff]
+            for job_id in expired:
+                del self.jobs[job_id]
+                self._discard_staged(job_id)
+                try:
+                    os.remove(os.path.join(self.jobs_dir, f'{job_id}.json'))
+                except FileNotFoundError:
+                    pass
+
+    def _run(self):
+        while True:
+            job_id = self.queue.get()
+            try:
+                self._execute(job_id)
+                self._discard_staged(job_id)
+                self._prune()
+            finally:
+                self.queue.task_done()
+
+    def _execute(self, job_id):
+        record = self.job(job_id)
+        stages = STAGES[record['kind']]
+        self._update(job_id, status='running')
+
+        try:
+            for i, stage in enumerate(stages):
+                if stage in record['stages_done']:
+                    continue
+
+                # per-stage progress is spread over this stage's share of the job
+                def progress(step, fraction, i=i):
+                    self._update(job_id, stage=f'{stage}: {step}',
+                                 progress=round((i + fraction) / len(stages), 3))
+
+                self._update(job_id, stage=stage, progress=round(i / len(stages), 3))
+                getattr(self, f'_stage_{stage}')(job_id, progress)
+                # records handed out are shallow copies, so the shared list is replaced, not appended to
+                record['stages_done'] = record['stages_done'] + [stage]
+                self._update(job_id, stages_done=record['stages_done'])
+
+            self._update(job_id, status='done', stage=None, progress=1.0, finished_at=_now())
+        except Exception as e:
+            self._update(job_id, status='failed', error=f'{type(e).__name__}: {e}', finished_at=_now())
+
+    # Read and validate the staged CSVs
+    def _stage_parse(self, job_id, progress):
+        record = self.job(job_id)
+        staged_dir = os.path.join(self.jobs_dir, job_id)
+        parsed, rejected = [], []
+        for i, file_name in enumerate(record['files']):
+            with open(os.path.join(staged_dir, f'{i}.csv'), 'rb') as f:
+                content = f.read()
+            df, reason = parse_statement(file_name, content)
+            if df is None:
+                rejected.append(reason)
+            else:
+                parsed.append({'file_name': file_name, 'data': df,
+                               'source_sha': hashlib.sha256(content).hexdigest()})
+            progress(file_name, (i + 1) / len(record['files']))
+
+        with open(os.path.join(staged_dir, 'parsed.pkl'), 'wb') as f:
+            pickle.dump(parsed, f)
+        self._update(job_id, rejected=rejected)
+
+    # Add the parsed statements to the store (safe to repeat: deduplicated by file name)
+    def _stage_store(self, job_id, progress):
+        with open(os.path.join(self.jobs_dir, job_id, 'parsed.pkl'), 'rb') as f:
+            parsed = pickle.load(f)
+        account = self.job(job_id).get('account', DEFAULT_ACCOUNT)
+        self._update(job_id, added=add_statements(parsed, account))
+
+    # Rebuild the analytics tables from the stored statements and publish them
+    def _stage_analyze(self, job_id, progress):
+        data_files = load_data_files()
+        if not data_files:
+            return
+        income_rules = load_income_rules()
+        accounts = load_accounts()
+        infos = analyze_accounts(data_files, accounts, income_rules, progress)
+        info = merge_infos(infos)
+        # charge cadences, only re-inferred for merchants with new transactions
+        info['merchant_cadence'] = update_profiles(info['expenses'])
+        _save_results({
+            'version': ANALYTICS_VERSION,
+            'key': inputs_key(data_files, income_rules, accounts),
+            'info': info,
+            'accounts': infos,
+            'completed_at': _now(),
+        })
+        export_info(info)
+
+
+# Analytics for every account with statements, keyed by account name.
+# Paycheck cycles come from the deposits of all accounts together, so every account shares
+# the household's cycles; accounts are then analyzed in parallel worker processes.
+def analyze_accounts(data_files, accounts, income_rules, progress=None):
+    partitions = {}
+    for file_info in data_files:
+        partitions.setdefault(file_info['account'], []).append(file_info)
+
+    transactions = pd.concat([file_info['data'] for file_info in data_files])
+    transactions['Date'] = pd.to_datetime(transactions['Date'])
+    starts = cycle_starts(transactions, income_rules)
+
+    def opening_balance(name):
+        return accounts.get(name, {}).get('opening_balance', 0.0)
+
+    if len(partitions) == 1:
+        name, files = next(iter(partitions.items()))
+        return {name: build_info(files, income_rules, opening_balance(name), progress, starts, name)}
+
+    infos = {}
+    if len(transactions) < PARALLEL_MIN_ROWS:
+        for name, files in partitions.items():
+            infos[name] = build_info(files, income_rules, opening_balance(name), None, starts, name)
+            if progress is not None:
+                progress(name, len(infos) / len(partitions))
+        return infos
+
+    pool = _get_pool()
+    futures = {pool.submit(build_info, files, income_rules, opening_balance(name), None, starts, name): name
+               for name, files in partitions.items()}
+    for future in as_completed(futures):
+        infos[futures[future]] = future.result()
+        if progress is not None:
+            progress(futures[future], len(infos) / len(partitions))
+    # keep the registry's account order
+    return {name: infos[name] for name in partitions}
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+# The process pool the accounts are analyzed in, started on first use and reused by every job.
+# Spawned rather than forked: the app process already runs threads (Streamlit, this worker).
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 1,
+                                        mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+# The process-wide worker (module state survives Streamlit reruns and is shared by sessions)
+def get_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = Worker()
+        return _worker